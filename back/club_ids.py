@@ -0,0 +1,28 @@
+"""Astron club ID mapping shared by the update_club_ids scripts."""
+
+import json
+import os
+
+CLUB_IDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'club_ids.json')
+
+
+def load_products(only: str = None) -> dict:
+    """Load the product mapping (Firestore slug -> Stripe ID, name, club ID).
+
+    A null club_id means the field should be removed.
+
+    Args:
+        only: Restrict the mapping to this Firestore slug
+
+    Returns:
+        Dict of slug -> product info
+
+    Raises:
+        KeyError: If `only` is not in the mapping
+    """
+    with open(CLUB_IDS_PATH, encoding='utf-8') as f:
+        products = json.load(f)
+
+    if only:
+        return {only: products[only]}
+    return products
@@ -6,6 +6,7 @@ from datetime import datetime
 from typing import Any
 from src.util.logger import get_logger
 from src.apis.Db import Db
+from src.util.pricing import reais_to_centavos
 import uuid
 
 logger = get_logger(__name__)
@@ -102,7 +103,7 @@ def update_manual_purchase_settings(req: https_fn.CallableRequest) -> dict[str,
 
         if override_price_reais is not None:
             manual_purchase['override_price_reais'] = override_price_reais
-            manual_purchase['override_price_centavos'] = int(override_price_reais * 100)
+            manual_purchase['override_price_centavos'] = reais_to_centavos(override_price_reais)
 
         if rotate_token:
             manual_purchase['override_token'] = str(uuid.uuid4())
@@ -8,7 +8,7 @@ from firebase_functions import https_fn, options
 from flask import jsonify
 from src.apis.Db import Db
 from src.util.logger import get_logger
-from src.util.rate_limiter import rate_limiter
+from src.util.rate_limiter import get_rate_limiter
 from src.models.firestore_types import LeadStatus
 
 logger = get_logger(__name__)
@@ -118,16 +118,6 @@ def create_checkout_lead(req: https_fn.Request):
         # Extract client info for rate limiting
         client_ip = _get_client_ip(req)
 
-        # Rate limiting: Check IP limit
-        ip_allowed, ip_remaining = rate_limiter.check_ip_limit(client_ip)
-        if not ip_allowed:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            retry_after = rate_limiter.get_retry_after("ip")
-            response = jsonify({"error": "Too many requests. Please try again later.", "code": "rate_limit_exceeded"})
-            response.status_code = 429
-            response.headers["Retry-After"] = str(retry_after)
-            return response
-
         # Extract and validate data
         name = str(request_data["name"]).strip()
         email = str(request_data["email"]).lower().strip()
@@ -137,11 +127,26 @@ def create_checkout_lead(req: https_fn.Request):
         affiliate_code = request_data.get("affiliate_code", "").strip() if request_data.get("affiliate_code") else None
         partner_offer = request_data.get("partner_offer")  # {partner: str, proofUrl: str}
 
-        # Rate limiting: Check email limit
-        email_allowed, email_remaining = rate_limiter.check_email_limit(email)
+        # Rate limiting: IP and email limits share each Firestore call
+        # (one for first-seen keys, three for returning keys)
+        rate_limiter = get_rate_limiter()
+        limits = rate_limiter.check_all(client_ip, email)
+
+        # Check IP limit
+        ip_allowed, ip_remaining = limits["ip"]
+        if not ip_allowed:
+            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
+            retry_after = limits["retry_after"]
+            response = jsonify({"error": "Too many requests. Please try again later.", "code": "rate_limit_exceeded"})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+
+        # Check email limit
+        email_allowed, email_remaining = limits["email"]
         if not email_allowed:
             logger.warning(f"Rate limit exceeded for email: {email}")
-            retry_after = rate_limiter.get_retry_after("email")
+            retry_after = limits["retry_after"]
             response = jsonify({"error": "Too many submissions for this email. Please try again tomorrow.", "code": "email_rate_limit"})
             response.status_code = 429
             response.headers["Retry-After"] = str(retry_after)
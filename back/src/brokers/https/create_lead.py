@@ -2,7 +2,8 @@
 
 import requests
 import os
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import pytz
 from firebase_functions import https_fn, options
@@ -11,7 +12,7 @@ from firebase_admin import storage
 from src.apis.Db import Db
 # CORS is handled by Firebase Functions v2 decorator, no need for manual handling
 from src.util.logger import get_logger
-from src.util.rate_limiter import rate_limiter
+from src.util.rate_limiter import get_rate_limiter
 from src.services.activecampaign_service import ActiveCampaignService
 from src.exceptions.CustomError import ExternalServiceError
 from src.util.retry_decorators import retry_firestore_operation
@@ -96,27 +97,32 @@ def create_lead(req: https_fn.Request):
         # Extract client info for rate limiting
         client_ip = _get_client_ip(req)
 
-        # Rate limiting: Check IP limit
-        ip_allowed, ip_remaining = rate_limiter.check_ip_limit(client_ip)
+        # Extract and validate data
+        name = str(request_data["name"]).strip()
+        email = str(request_data["email"]).lower().strip()
+        phone = request_data.get("phone", "").strip() if request_data.get("phone") else ""
+        # recaptcha_token = str(request_data["recaptchaToken"]).strip()  # DISABLED
+
+        # Rate limiting: IP and email limits share each Firestore call
+        # (one for first-seen keys, three for returning keys)
+        rate_limiter = get_rate_limiter()
+        limits = rate_limiter.check_all(client_ip, email)
+
+        # Check IP limit
+        ip_allowed, ip_remaining = limits["ip"]
         if not ip_allowed:
             logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            retry_after = rate_limiter.get_retry_after("ip")
+            retry_after = limits["retry_after"]
             response = jsonify({"error": "Too many requests. Please try again later.", "code": "rate_limit_exceeded"})
             response.status_code = 429
             response.headers["Retry-After"] = str(retry_after)
             return response
 
-        # Extract and validate data
-        name = str(request_data["name"]).strip()
-        email = str(request_data["email"]).lower().strip()
-        phone = request_data.get("phone", "").strip() if request_data.get("phone") else ""
-        # recaptcha_token = str(request_data["recaptchaToken"]).strip()  # DISABLED
-
-        # Rate limiting: Check email limit
-        email_allowed, email_remaining = rate_limiter.check_email_limit(email)
+        # Check email limit
+        email_allowed, email_remaining = limits["email"]
         if not email_allowed:
             logger.warning(f"Rate limit exceeded for email: {email}")
-            retry_after = rate_limiter.get_retry_after("email")
+            retry_after = limits["retry_after"]
             response = jsonify({"error": "Too many submissions for this email. Please try again tomorrow.", "code": "email_rate_limit"})
             response.status_code = 429
             response.headers["Retry-After"] = str(retry_after)
@@ -305,24 +311,34 @@ def _get_client_ip(req: https_fn.Request) -> str:
     return getattr(req, 'remote_addr', 'unknown')
 
 
+UTM_FIELDS = (
+    "utm_source", "utm_medium", "utm_campaign",
+    "utm_term", "utm_content", "referrer",
+    "gclid", "fbclid"
+)
+
+
+@lru_cache(maxsize=2048)
+def _utm_cached(*values: str) -> Tuple[Tuple[str, str], ...]:
+    """Map raw UTM values (in UTM_FIELDS order) to their stored (key, value) pairs.
+
+    Returns an immutable tuple so cached results can be shared safely; repeated
+    payloads (retries, the same campaign link) skip the per-field work.
+    """
+    return tuple(
+        (field.replace("utm_", ""), value)
+        for field, value in zip(UTM_FIELDS, values)
+        if value
+    )
+
+
 def _extract_utm_data(request_data: Dict[str, Any]) -> Dict[str, Any]:
     """Extract UTM and tracking data from request."""
-    utm_fields = [
-        "utm_source", "utm_medium", "utm_campaign", 
-        "utm_term", "utm_content", "referrer", 
-        "gclid", "fbclid"
-    ]
-    
-    current_timestamp = Db.timestamp_now()
-    
-    # Extract current UTM data
-    current_utm = {}
-    for field in utm_fields:
-        value = request_data.get(field, "")
-        if value:
-            current_utm[field.replace("utm_", "")] = str(value)
-    
-    current_utm["timestamp"] = current_timestamp
+    utm_items = _utm_cached(*(str(request_data.get(field) or "") for field in UTM_FIELDS))
+
+    # Timestamp is per request, so it is added outside the cache
+    current_utm = dict(utm_items)
+    current_utm["timestamp"] = Db.timestamp_now()
     
     # For new leads, both first and last touch are the same
     return {
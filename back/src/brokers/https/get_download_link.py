@@ -60,14 +60,15 @@ def get_download_link(req: https_fn.CallableRequest) -> Dict[str, Any]:
         lead_id, lead_data = lead
         
         # Check download limits
-        can_download, limit_message = _check_download_limits(lead_data)
+        can_download, limit_message, retry_after = _check_download_limits(lead_data)
         if not can_download:
             logger.info(f"Download limit exceeded for email: {email}")
             # Return error response instead of raising exception
             return {
                 "success": False,
                 "error": limit_message,
-                "code": "download_limit_exceeded"
+                "code": "download_limit_exceeded",
+                "retryAfterSeconds": retry_after
             }
         
         # Get e-book storage path from settings
@@ -137,14 +138,20 @@ def _get_lead_by_email(db: Db, email: str) -> Optional[tuple]:
         return None
 
 
-def _check_download_limits(lead_data: Dict[str, Any]) -> tuple[bool, str]:
+def _now() -> datetime:
+    """Current UTC time; tests patch this to freeze the clock."""
+    return datetime.now(timezone.utc)
+
+
+def _check_download_limits(lead_data: Dict[str, Any]) -> tuple[bool, str, int]:
     """Check if lead can download based on 24h limits.
     
     Args:
         lead_data: Lead document data
         
     Returns:
-        Tuple of (can_download: bool, message: str)
+        Tuple of (can_download: bool, message: str, retry_after_seconds: int),
+        where retry_after_seconds is 0 when the download is allowed
     """
     download_info = lead_data.get("download", {})
     current_count = download_info.get("count24h", 0)
@@ -152,10 +159,10 @@ def _check_download_limits(lead_data: Dict[str, Any]) -> tuple[bool, str]:
     
     # If no previous downloads, allow
     if current_count == 0 or not last_download:
-        return True, ""
+        return True, "", 0
     
     # Check if we're within 24h window of last download
-    now = datetime.now(timezone.utc)
+    now = _now()
     
     # Handle both Firestore timestamp and datetime objects
     if hasattr(last_download, 'to_pydatetime'):
@@ -171,14 +178,14 @@ def _check_download_limits(lead_data: Dict[str, Any]) -> tuple[bool, str]:
     
     # If more than 24 hours have passed, reset the counter (conceptually)
     if time_since_last >= timedelta(hours=24):
-        return True, ""
+        return True, "", 0
     
     # Within 24h window - check count
     if current_count >= MAX_DOWNLOADS_PER_24H:
-        hours_remaining = 24 - (time_since_last.total_seconds() / 3600)
-        return False, f"Download limit reached. Try again in {int(hours_remaining)} hours."
+        retry_after = int((timedelta(hours=24) - time_since_last).total_seconds())
+        return False, f"Download limit reached. Try again in {retry_after // 3600} hours.", retry_after
     
-    return True, ""
+    return True, "", 0
 
 
 def _get_ebook_storage_path(db: Db) -> Optional[str]:
@@ -1,10 +1,11 @@
 """Service for ActiveCampaign API v3 integration."""
 
 import os
+import threading
 import time
 import traceback
 import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
 from src.util.logger import get_logger
 from src.exceptions.CustomError import ExternalServiceError
@@ -16,6 +17,44 @@ from src.models.activecampaign_types import (
 
 logger = get_logger(__name__)
 
+# Tag and list IDs are effectively static, so lookups are cached for the life
+# of the warm instance (services are built per request). Keyed by (base_url,
+# kind, lowercased name) -> (id, expires_at monotonic seconds). Misses are
+# never cached, so newly created tags/lists are found on the next lookup.
+ID_CACHE_TTL = 3600
+_id_cache: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+_id_cache_lock = threading.Lock()
+
+
+class _TokenBucket:
+    """Token bucket that only sleeps when no request token is available.
+
+    Holds up to `capacity` tokens refilled at `rate` per second, so bursts of
+    `capacity` requests go out immediately while the sustained rate stays at
+    `rate` per second.
+    """
+
+    def __init__(self, rate: float = 5, capacity: float = 5):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take one token, sleeping until it has refilled if the bucket is empty."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+            # Reserve the token even when empty, so concurrent callers queue up
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
 
 class ActiveCampaignService:
     """Service for ActiveCampaign API v3 integration.
@@ -75,7 +114,7 @@ class ActiveCampaignService:
             "Api-Token": self.api_key,
             "Content-Type": "application/json"
         }
-        self.last_request_time = 0
+        self._bucket = _TokenBucket(rate=5, capacity=5)
 
     def _get_setting_with_fallback(
         self,
@@ -151,15 +190,12 @@ class ActiveCampaignService:
             logger.error(f"Failed to log error to Firestore: {log_error}")
 
     def _rate_limit(self):
-        """Ensure 200ms between requests (4 req/sec, conservative).
+        """Respect ActiveCampaign's 5 req/sec limit.
 
-        ActiveCampaign limits to 5 req/sec, so we use 200ms (4 req/sec)
-        to provide a safety margin.
+        Up to 5 requests go out back to back; after that each request waits
+        for the bucket to refill (200ms per request).
         """
-        elapsed = time.time() - self.last_request_time
-        if elapsed < 0.2:
-            time.sleep(0.2 - elapsed)
-        self.last_request_time = time.time()
+        self._bucket.acquire()
 
     def _request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict[str, Any]:
         """Make API request with error handling and rate limiting.
@@ -254,6 +290,38 @@ class ActiveCampaignService:
         logger.info(f"ActiveCampaign contact synced: {email} (ID: {contact_id})")
         return contact_id
 
+    def _cached_id(self, kind: str, name: str) -> Optional[str]:
+        """Get a cached tag/list ID by name, if present and not expired.
+
+        Args:
+            kind: "tag" or "list"
+            name: Tag or list name (case-insensitive)
+
+        Returns:
+            Cached ID, or None on a miss
+        """
+        with _id_cache_lock:
+            cached = _id_cache.get((self.base_url, kind, name.lower()))
+
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        return None
+
+    def _cache_ids(self, kind: str, items: list, name_field: str) -> None:
+        """Cache the ID of every tag/list in an API response.
+
+        Args:
+            kind: "tag" or "list"
+            items: Tag or list objects from the API response
+            name_field: Key holding the item's name ("tag" or "name")
+        """
+        expires_at = time.monotonic() + ID_CACHE_TTL
+
+        with _id_cache_lock:
+            for item in items:
+                _id_cache[(self.base_url, kind, item[name_field].lower())] = (item["id"], expires_at)
+
     def get_tag_id(self, tag_name: str) -> Optional[str]:
         """Get tag ID by tag name.
 
@@ -263,8 +331,13 @@ class ActiveCampaignService:
         Returns:
             Tag ID (string) if found, None otherwise
         """
+        cached_id = self._cached_id("tag", tag_name)
+        if cached_id:
+            return cached_id
+
         response = self._request("GET", "/tags")
         tags = response.get("tags", [])
+        self._cache_ids("tag", tags, "tag")
 
         for tag in tags:
             if tag["tag"].lower() == tag_name.lower():
@@ -306,8 +379,13 @@ class ActiveCampaignService:
         Returns:
             List ID (string) if found, None otherwise
         """
+        cached_id = self._cached_id("list", list_name)
+        if cached_id:
+            return cached_id
+
         response = self._request("GET", "/lists")
         lists = response.get("lists", [])
+        self._cache_ids("list", lists, "name")
 
         for list_item in lists:
             if list_item["name"].lower() == list_name.lower():
@@ -438,6 +516,56 @@ class ActiveCampaignService:
             "tag_id": tag_id
         }
 
+    def process_lead_batched(self, email: str, name: str, phone: str = "", download_link: str = "") -> Dict[str, Any]:
+        """Queue a lead with its list, tag and download link in one request.
+
+        /contact/sync cannot attach lists or tags, so this goes through
+        /import/bulk_import, which accepts the contact, its list subscription,
+        tag and custom field in a single body. The import is processed
+        asynchronously and returns no contact ID; use process_lead when the
+        caller needs the ID.
+
+        Args:
+            email: Lead email address
+            name: Lead full name
+            phone: Lead phone number in E.164 format
+            download_link: Download URL for the ebook (stored in custom field)
+
+        Returns:
+            Dict with:
+            - success: bool (True if the import was queued)
+            - batch_id: str (ActiveCampaign import batch ID)
+            - list_id: str (ActiveCampaign list ID)
+        """
+        # Parse name into first/last
+        name_parts = name.split(maxsplit=1)
+        first_name = name_parts[0] if name_parts else ""
+        last_name = name_parts[1] if len(name_parts) > 1 else ""
+
+        # List ID is cached after the first lead, so this is usually free
+        list_id = self.get_list_id_by_name(self.ebook_list_name)
+
+        contact = {
+            "email": email,
+            "first_name": first_name,
+            "last_name": last_name,
+            "phone": phone,
+            "tags": [self.ebook_tag_name],  # Tags are matched by name
+            "subscribe": [{"listid": list_id}]
+        }
+
+        if download_link:
+            contact["fields"] = [{"id": self.download_field_id, "value": download_link}]
+
+        response = self._request("POST", "/import/bulk_import", {"contacts": [contact]})
+
+        logger.info(f"ActiveCampaign lead import queued: {email} (batch: {response.get('batchId')})")
+        return {
+            "success": response.get("success") == 1,
+            "batch_id": response.get("batchId"),
+            "list_id": list_id
+        }
+
     def sync_customer_purchase(
         self,
         email: str,
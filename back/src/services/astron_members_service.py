@@ -20,8 +20,14 @@ class AstronMembersService:
     not RESTful paths (e.g., /clubs, /users).
     """
 
-    def __init__(self):
-        """Initialize Astron Members service with proper authentication."""
+    def __init__(self, session: Optional[requests.Session] = None):
+        """Initialize Astron Members service with proper authentication.
+
+        Args:
+            session: HTTP session to send requests through. Defaults to a new
+                session, so connections to the API host are kept alive and
+                reused across calls.
+        """
         self.base_url = os.environ.get(
             "ASTRON_MEMBERS_API_URL",
             "https://api.astronmembers.com.br/v1.0"
@@ -43,6 +49,8 @@ class AstronMembersService:
             'Content-Type': 'application/x-www-form-urlencoded'
         }
 
+        self.session = session or requests.Session()
+
         logger.info("Initialized Astron Members service with Basic Auth")
 
     def create_user(
@@ -81,7 +89,7 @@ class AstronMembersService:
         }
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 url,
                 data=payload,  # urlencoded format
                 auth=self.auth,
@@ -187,7 +195,7 @@ class AstronMembersService:
             payload['planId'] = plan_id
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 url,
                 data=payload,
                 auth=self.auth,
@@ -266,7 +274,7 @@ class AstronMembersService:
                     'email': email
                 }
 
-            response = requests.get(
+            response = self.session.get(
                 url,
                 params=params,
                 auth=self.auth,
@@ -322,7 +330,7 @@ class AstronMembersService:
                 'email': email
             }
 
-            response = requests.post(
+            response = self.session.post(
                 url,
                 data=payload,
                 auth=self.auth,
@@ -373,7 +381,7 @@ class AstronMembersService:
                 'userId': astron_member_id
             }
 
-            response = requests.get(
+            response = self.session.get(
                 url,
                 params=params,
                 auth=self.auth,
@@ -167,6 +167,12 @@ class DubService:
             secret.encode('utf-8'),
             payload.encode('utf-8'),
             hashlib.sha256
-        ).hexdigest()
+        ).digest()
 
-        return hmac.compare_digest(signature, expected)
\ No newline at end of file
+        # Compare raw digests so a malformed or non-ASCII header can't raise
+        try:
+            provided = bytes.fromhex(signature)
+        except ValueError:
+            return False
+
+        return hmac.compare_digest(provided, expected)
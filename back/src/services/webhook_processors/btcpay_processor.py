@@ -5,6 +5,7 @@ from src.documents.customers.Subscription import Subscription
 from src.documents.payments.Payment import Payment
 from src.models.firestore_types import PaymentStatus, SubscriptionStatus
 from src.util.logger import get_logger
+from src.util.pricing import reais_to_centavos
 
 logger = get_logger(__name__)
 
@@ -60,7 +61,7 @@ def process_invoice_settled(event: dict):
             'id': payment_id,
             'subscription_id': subscription_id,
             'customer_id': subscription.doc.customer_id,
-            'amount': int(float(invoice.get('amount', 0)) * 100),  # Convert to centavos
+            'amount': reais_to_centavos(float(invoice.get('amount', 0))),
             'currency': invoice.get('currency', 'BRL'),
             'status': PaymentStatus.CONFIRMED.value,
             'payment_method': subscription.doc.payment_method.value,
@@ -1,7 +1,7 @@
 """Process dub.co webhook events."""
 
 import json
-from typing import Dict, Any
+from typing import Callable, Dict, Any
 from google.cloud import firestore
 from src.util.logger import get_logger
 from src.documents.webhooks.WebhookEvent import WebhookEvent
@@ -25,22 +25,13 @@ def process_dub_webhook(event: Dict[str, Any]) -> Dict[str, Any]:
     logger.info(f"Processing dub.co event: {event_type}, ID: {event_id}")
 
     # Route to specific handler
-    if event_type == 'sale.created':
-        return _process_sale_created(event_data)
-    elif event_type == 'lead.created':
-        return _process_lead_created(event_data)
-    elif event_type == 'commission.created':
-        return _process_commission_created(event_data)
-    elif event_type == 'partner.enrolled':
-        return _process_partner_enrolled(event_data)
-    elif event_type == 'link.created':
-        return _process_link_created(event_data)
-    elif event_type == 'link.clicked':
-        return _process_link_clicked(event_data)
-    else:
+    handler = _HANDLERS.get(event_type)
+    if handler is None:
         logger.warning(f"Unhandled dub.co event type: {event_type}")
         return {'processed': False, 'reason': f'Unhandled event type: {event_type}'}
 
+    return handler(event_data)
+
 
 def _process_sale_created(data: Dict[str, Any]) -> Dict[str, Any]:
     """Process sale.created event.
@@ -243,4 +234,15 @@ def _process_link_clicked(data: Dict[str, Any]) -> Dict[str, Any]:
     # Usually don't need to process individual clicks
     # This is a high-volume event
 
-    return {'processed': True, 'click_id': click_id}
\ No newline at end of file
+    return {'processed': True, 'click_id': click_id}
+
+
+# Event type -> handler, used by process_dub_webhook
+_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    'sale.created': _process_sale_created,
+    'lead.created': _process_lead_created,
+    'commission.created': _process_commission_created,
+    'partner.enrolled': _process_partner_enrolled,
+    'link.created': _process_link_created,
+    'link.clicked': _process_link_clicked,
+}
@@ -1,9 +1,10 @@
 """Stripe webhook event processor."""
 
-import time
+from google.api_core.exceptions import AlreadyExists
 from src.documents.customers.Subscription import Subscription
-from src.documents.payments.Payment import Payment
-from src.models.firestore_types import PaymentStatus, SubscriptionStatus
+from src.services.lead_conversion_service import LeadConversionService
+from src.services.customer_provisioning_service import CustomerProvisioningService
+from src.models.firestore_types import PaymentDoc, PaymentStatus, SubscriptionStatus
 from src.util.logger import get_logger
 
 logger = get_logger(__name__)
@@ -28,134 +29,160 @@ def process_checkout_completed(event: dict):
     try:
         subscription = Subscription(id=subscription_id)
 
-        # Update subscription with provider ID
-        subscription.update_doc({
-            'provider_subscription_id': session['id']
+        # Check if payment is completed
+        if session.get('payment_status') != 'paid':
+            # Update subscription with provider ID only
+            subscription.update_doc({
+                'provider_subscription_id': session['id']
+            })
+            return
+
+        db_instance = subscription.db
+        now = db_instance.timestamp_now()
+
+        # Subscription, payment and manual verification writes for this event
+        # are committed together in one batch: one round trip, all-or-nothing
+        batch = db_instance.client.batch()
+
+        # Set provider ID and activate subscription in a single update
+        subscription_ref = subscription.get_doc_ref()
+        subscription_update = {
+            'provider_subscription_id': session['id'],
+            'status': SubscriptionStatus.ACTIVE.value,
+            'access_granted_at': now,
+            'lastUpdatedAt': now
+        }
+        batch.update(subscription_ref, subscription_update)
+
+        # Create payment record, keyed by the Stripe event ID so a redelivered
+        # event maps to the same document and the create below rejects it
+        payment_id = f"payment_{subscription_id}_{event['id']}"
+        payment_data = {
+            'id': payment_id,
+            'subscription_id': subscription_id,
+            'customer_id': subscription.doc.customer_id,
+            'amount': session.get('amount_total', 0),
+            'currency': session.get('currency', 'brl').upper(),
+            'status': PaymentStatus.CONFIRMED.value,
+            'payment_method': subscription.doc.payment_method.value,
+            'payment_provider': 'stripe',
+            'provider_payment_id': session.get('payment_intent'),
+            'provider_metadata': {
+                'session_id': session['id'],
+                'customer_email': session.get('customer_details', {}).get('email') if session.get('customer_details') else None
+            },
+            'processed_at': now
+        }
+        # Validate against the model as Payment.create_doc would, before queueing the raw dict
+        PaymentDoc(**payment_data, createdAt=now, lastUpdatedAt=now)
+        batch.create(db_instance.collections['payments'].document(payment_id), {
+            **payment_data,
+            'createdAt': db_instance.server_timestamp,
+            'lastUpdatedAt': db_instance.server_timestamp
         })
 
-        # Check if payment is completed
-        if session.get('payment_status') == 'paid':
-            # Activate subscription
-            subscription.activate()
-            logger.info(f"Activated subscription {subscription_id}")
+        # Read auto-provisioning toggle ONCE and use snapshot (safe default: False)
+        settings_ref = db_instance.collections['settings'].document('main')
+        settings_doc = settings_ref.get()
 
-            # Convert checkout lead to customer (non-critical operation)
-            should_provision = True
-            try:
-                from src.services.lead_conversion_service import LeadConversionService
-                lead_service = LeadConversionService()
-                result = lead_service.mark_lead_as_converted(subscription_id)
-
-                # Check if provisioning should be paused (manual verification)
-                if result.get('requires_manual_verification'):
-                    should_provision = False
-                    logger.info(f"Provisioning paused for {subscription_id} - requires manual verification")
-                elif result.get('success'):
-                    logger.info(f"Lead conversion successful: {result.get('reason', 'converted')}")
-            except Exception as e:
-                logger.error(f"Lead conversion failed for {subscription_id}: {e}")
-                # Non-critical, continue processing
-
-            # Create payment record
-            payment_id = f"payment_{subscription_id}_{int(time.time())}"
-            payment = Payment(id=payment_id)
-            payment.create_doc({
-                'id': payment_id,
-                'subscription_id': subscription_id,
-                'customer_id': subscription.doc.customer_id,
-                'amount': session.get('amount_total', 0),
-                'currency': session.get('currency', 'brl').upper(),
-                'status': PaymentStatus.CONFIRMED.value,
-                'payment_method': subscription.doc.payment_method.value,
-                'payment_provider': 'stripe',
-                'provider_payment_id': session.get('payment_intent'),
-                'provider_metadata': {
-                    'session_id': session['id'],
-                    'customer_email': session.get('customer_details', {}).get('email') if session.get('customer_details') else None
-                },
-                'processed_at': subscription.db.timestamp_now()
-            })
+        auto_prov_enabled = False  # Safe default
+        if settings_doc.exists:
+            settings_data = settings_doc.to_dict()
+            auto_prov_enabled = settings_data.get('auto_provisioning_enabled', False)
 
+        # If toggle OFF, create manual_verification instead of provisioning
+        verification_ref = None
+        if not auto_prov_enabled:
+            logger.info(f"Auto-provisioning disabled - creating manual verification for {subscription_id}")
+
+            # CRITICAL: Check if manual_verification already exists (webhook retry idempotency)
+            existing = db_instance.collections['manual_verifications'].where(
+                'subscription_created', '==', subscription_id
+            ).limit(1).get()
+
+            if len(existing) > 0:
+                logger.warning(f"Manual verification already exists for {subscription_id}, skipping creation")
+            else:
+                # Create manual_verification entry
+                verification_ref = db_instance.collections['manual_verifications'].document()
+                verification_data = {
+                    'email': getattr(subscription.doc, 'customer_email', ''),
+                    'upload_url': '',  # Empty for auto-generated
+                    'status': 'pending',
+                    'auto_generated': True,  # Flag to distinguish from partner offers
+                    'customer_name': getattr(subscription.doc, 'customer_name', ''),
+                    'customer_phone': getattr(subscription.doc, 'customer_phone', ''),
+                    'submitted_at': now,
+                    'reviewed_by': None,
+                    'reviewed_at': None,
+                    'notes': 'Auto-generated - payment confirmed, awaiting manual approval (auto-provisioning toggle OFF)',
+                    'subscription_created': subscription_id  # Link to subscription
+                }
+                batch.set(verification_ref, verification_data)
+
+        try:
+            batch.commit()
             logger.info(f"Created payment record {payment_id} for subscription {subscription_id}")
+        except AlreadyExists:
+            # Redelivered event: the payment is already recorded, but an earlier
+            # attempt may have failed before provisioning, so apply the other
+            # writes and carry on
+            logger.warning(f"Payment {payment_id} already recorded for event {event['id']}, skipping payment write")
+            batch = db_instance.client.batch()
+            batch.update(subscription_ref, subscription_update)
+            if verification_ref is not None:
+                batch.set(verification_ref, verification_data)
+            batch.commit()
+
+        logger.info(f"Activated subscription {subscription_id}")
+        if verification_ref is not None:
+            logger.info(f"Created auto-generated manual verification {verification_ref.id} for subscription {subscription_id}")
+
+        # Convert checkout lead to customer (non-critical operation)
+        should_provision = True
+        lead_service = LeadConversionService()
+        try:
+            result = lead_service.mark_lead_as_converted(subscription_id)
+
+            # Check if provisioning should be paused (manual verification)
+            if result.get('requires_manual_verification'):
+                should_provision = False
+                logger.info(f"Provisioning paused for {subscription_id} - requires manual verification")
+            elif result.get('success'):
+                logger.info(f"Lead conversion successful: {result.get('reason', 'converted')}")
+        except Exception as e:
+            logger.error(f"Lead conversion failed for {subscription_id}: {e}")
+            # Non-critical, continue processing
+
+        logger.info(f"Auto-provisioning toggle: {auto_prov_enabled}, Manual verification flag: {not should_provision} for {subscription_id}")
+
+        # Trigger provisioning workflow ONLY if toggle ON and not paused by per-lead flag
+        if auto_prov_enabled and should_provision:
+            try:
+                provisioning_service = CustomerProvisioningService()
+                provisioning_result = provisioning_service.provision_customer(subscription_id)
 
-            # Read auto-provisioning toggle ONCE and use snapshot (safe default: False)
-            from src.apis.Db import Db
-            db_instance = Db.get_instance()
-            settings_ref = db_instance.collections['settings'].document('main')
-            settings_doc = settings_ref.get()
-
-            auto_prov_enabled = False  # Safe default
-            if settings_doc.exists:
-                settings_data = settings_doc.to_dict()
-                auto_prov_enabled = settings_data.get('auto_provisioning_enabled', False)
-
-            logger.info(f"Auto-provisioning toggle: {auto_prov_enabled}, Manual verification flag: {not should_provision} for {subscription_id}")
-
-            # If toggle OFF, create manual_verification instead of provisioning
-            if not auto_prov_enabled:
-                logger.info(f"Auto-provisioning disabled - creating manual verification for {subscription_id}")
-
-                # CRITICAL: Check if manual_verification already exists (webhook retry idempotency)
-                existing = db_instance.collections['manual_verifications'].where(
-                    'subscription_created', '==', subscription_id
-                ).limit(1).get()
-
-                if len(existing) > 0:
-                    logger.warning(f"Manual verification already exists for {subscription_id}, skipping creation")
-                else:
-                    # Create manual_verification entry
-                    verification_data = {
-                        'email': getattr(subscription.doc, 'customer_email', ''),
-                        'upload_url': '',  # Empty for auto-generated
-                        'status': 'pending',
-                        'auto_generated': True,  # Flag to distinguish from partner offers
-                        'customer_name': getattr(subscription.doc, 'customer_name', ''),
-                        'customer_phone': getattr(subscription.doc, 'customer_phone', ''),
-                        'submitted_at': db_instance.timestamp_now(),
-                        'reviewed_by': None,
-                        'reviewed_at': None,
-                        'notes': 'Auto-generated - payment confirmed, awaiting manual approval (auto-provisioning toggle OFF)',
-                        'subscription_created': subscription_id  # Link to subscription
-                    }
-
-                    _, verification_ref = db_instance.collections['manual_verifications'].add(verification_data)
-                    verification_id = verification_ref.id
-
-                    logger.info(f"Created auto-generated manual verification {verification_id} for subscription {subscription_id}")
-
-            # Trigger provisioning workflow ONLY if toggle ON and not paused by per-lead flag
-            elif should_provision:
+                logger.info(f"Provisioning triggered successfully for subscription: {subscription_id}")
+
+                # Mark lead provisioning complete
                 try:
-                    from src.services.customer_provisioning_service import CustomerProvisioningService
-
-                    provisioning_service = CustomerProvisioningService()
-                    provisioning_result = provisioning_service.provision_customer(subscription_id)
-
-                    logger.info(f"Provisioning triggered successfully for subscription: {subscription_id}")
-
-                    # Mark lead provisioning complete
-                    try:
-                        from src.services.lead_conversion_service import LeadConversionService
-                        lead_service = LeadConversionService()
-                        lead_service.mark_lead_provisioning_complete(subscription_id)
-                    except Exception as lead_error:
-                        logger.error(f"Failed to update lead provisioning status: {lead_error}")
-
-                except Exception as provisioning_error:
-                    logger.error(f"Provisioning failed for {subscription_id}: {provisioning_error}", exc_info=True)
-
-                    # Mark lead provisioning failed
-                    try:
-                        from src.services.lead_conversion_service import LeadConversionService
-                        lead_service = LeadConversionService()
-                        lead_service.mark_lead_provisioning_failed(subscription_id, str(provisioning_error))
-                    except Exception as lead_error:
-                        logger.error(f"Failed to update lead provisioning failure: {lead_error}")
-
-                    # Don't fail webhook processing if provisioning fails
-                    # Admin can retry manually
-            else:
-                logger.info(f"Provisioning skipped for {subscription_id} - waiting for manual verification approval")
+                    lead_service.mark_lead_provisioning_complete(subscription_id)
+                except Exception as lead_error:
+                    logger.error(f"Failed to update lead provisioning status: {lead_error}")
+
+            except Exception as provisioning_error:
+                logger.error(f"Provisioning failed for {subscription_id}: {provisioning_error}", exc_info=True)
+
+                # Mark lead provisioning failed
+                try:
+                    lead_service.mark_lead_provisioning_failed(subscription_id, str(provisioning_error))
+                except Exception as lead_error:
+                    logger.error(f"Failed to update lead provisioning failure: {lead_error}")
+
+                # Don't fail webhook processing if provisioning fails
+                # Admin can retry manually
+        elif auto_prov_enabled:
+            logger.info(f"Provisioning skipped for {subscription_id} - waiting for manual verification approval")
 
     except Exception as e:
         logger.error(f"Error processing checkout.session.completed: {e}", exc_info=True)
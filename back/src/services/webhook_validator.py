@@ -1,6 +1,7 @@
 """Unified webhook validation for payment providers."""
 
 import json
+from functools import lru_cache
 from src.services.stripe_service import StripeService
 from src.services.btcpay_service import BTCPayService
 from src.services.dub_service import DubService
@@ -8,6 +9,34 @@ from src.util.logger import get_logger
 
 logger = get_logger(__name__)
 
+# orjson parses in C and accepts str payloads directly; its JSONDecodeError
+# subclasses json.JSONDecodeError, so error handling is the same either way
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+# Services only read env config in their constructors, so one instance per
+# warm function instance is enough. Failed constructions are not cached.
+@lru_cache(maxsize=1)
+def _stripe_service() -> StripeService:
+    """Get the shared StripeService instance."""
+    return StripeService()
+
+
+@lru_cache(maxsize=1)
+def _btcpay_service() -> BTCPayService:
+    """Get the shared BTCPayService instance."""
+    return BTCPayService()
+
+
+@lru_cache(maxsize=1)
+def _dub_service() -> DubService:
+    """Get the shared DubService instance."""
+    return DubService()
+
 
 def validate_stripe_webhook(payload: str, signature: str) -> dict:
     """Validate Stripe webhook signature and return event.
@@ -22,8 +51,7 @@ def validate_stripe_webhook(payload: str, signature: str) -> dict:
     Raises:
         ValueError: If signature verification fails
     """
-    service = StripeService()
-    return service.verify_webhook_signature(payload, signature)
+    return _stripe_service().verify_webhook_signature(payload, signature)
 
 
 def validate_btcpay_webhook(payload: str, signature: str) -> dict:
@@ -39,14 +67,12 @@ def validate_btcpay_webhook(payload: str, signature: str) -> dict:
     Raises:
         ValueError: If signature verification fails
     """
-    service = BTCPayService()
-
-    if not service.verify_webhook_signature(payload, signature):
+    if not _btcpay_service().verify_webhook_signature(payload, signature):
         raise ValueError('Invalid BTCPay signature')
 
     # Parse JSON payload
     try:
-        return json.loads(payload)
+        return _json_loads(payload)
     except json.JSONDecodeError as e:
         raise ValueError(f'Invalid JSON payload: {str(e)}')
 
@@ -64,18 +90,25 @@ def validate_dub_webhook(payload: str, signature: str) -> dict:
     Raises:
         ValueError: If signature verification fails
     """
-    service = DubService()
-
-    if not service.verify_webhook_signature(payload, signature):
+    if not _dub_service().verify_webhook_signature(payload, signature):
         raise ValueError('Invalid dub.co signature')
 
     # Parse JSON payload
     try:
-        return json.loads(payload)
+        return _json_loads(payload)
     except json.JSONDecodeError as e:
         raise ValueError(f'Invalid JSON payload: {str(e)}')
 
 
+# Provider name → validator, including the btcpay/btcpayserver alias
+_VALIDATORS = {
+    'stripe': validate_stripe_webhook,
+    'btcpay': validate_btcpay_webhook,
+    'btcpayserver': validate_btcpay_webhook,
+    'dub': validate_dub_webhook,
+}
+
+
 def validate_webhook(provider: str, payload: str, signature: str) -> dict:
     """Validate webhook based on provider.
 
@@ -90,13 +123,9 @@ def validate_webhook(provider: str, payload: str, signature: str) -> dict:
     Raises:
         ValueError: If provider is unknown or signature verification fails
     """
-    logger.info(f"Validating webhook for provider: {provider}")
-
-    if provider == 'stripe':
-        return validate_stripe_webhook(payload, signature)
-    elif provider in ['btcpay', 'btcpayserver']:
-        return validate_btcpay_webhook(payload, signature)
-    elif provider == 'dub':
-        return validate_dub_webhook(payload, signature)
-    else:
+    logger.info("Validating webhook for provider: %s", provider)
+
+    validator = _VALIDATORS.get(provider)
+    if validator is None:
         raise ValueError(f'Unknown provider: {provider}')
+    return validator(payload, signature)
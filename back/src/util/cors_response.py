@@ -1,18 +1,27 @@
 """CORS response utility for HTTP functions."""
 
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, FrozenSet
 from flask import Response, jsonify, request
 from firebase_functions import https_fn
 
 
-ALLOWED_ORIGINS = [
+ALLOWED_ORIGINS: FrozenSet[str] = frozenset([
     "http://localhost:3000",
     "http://localhost:3001",
     "https://r38tao-5bdf1.web.app",
     "https://r38tao-5bdf1.firebaseapp.com",
     "https://renato38.com.br",
     "https://www.renato38.com.br"
-]
+])
+
+# Preflight headers shared by every OPTIONS response; only the origin and
+# method list vary per request
+_BASE_PREFLIGHT_HEADERS = {
+    "Access-Control-Allow-Headers": "Content-Type, Authorization",
+    "Access-Control-Allow-Credentials": "true",
+    "Access-Control-Max-Age": "3600",
+    "Vary": "Origin",
+}
 
 
 def get_allowed_origin(request_origin: str = None) -> str:
@@ -42,12 +51,9 @@ def cors_response_on_call(raw_request) -> Optional[Dict[str, Any]]:
     if raw_request.method == "OPTIONS":
         origin = raw_request.headers.get('Origin', '')
         headers = {
+            **_BASE_PREFLIGHT_HEADERS,
             "Access-Control-Allow-Origin": get_allowed_origin(origin),
             "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization",
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Max-Age": "3600",
-            "Vary": "Origin",
         }
         return ("", 204, headers)
     return None
@@ -62,22 +68,20 @@ def handle_cors_preflight(req: https_fn.Request, allowed_methods: list = None):
         
     Raises:
         Response: CORS preflight response for OPTIONS requests
+            (403 without CORS headers for origins not in ALLOWED_ORIGINS)
     """
     if req.method == "OPTIONS":
-        methods = allowed_methods or ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
         origin = req.headers.get('Origin', '')
+        if origin and origin not in ALLOWED_ORIGINS:
+            raise Response("", status=403)
+
+        methods = allowed_methods or ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
         headers = {
+            **_BASE_PREFLIGHT_HEADERS,
             "Access-Control-Allow-Origin": get_allowed_origin(origin),
             "Access-Control-Allow-Methods": ", ".join(methods),
-            "Access-Control-Allow-Headers": "Content-Type, Authorization",
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Max-Age": "3600",
-            "Vary": "Origin",
         }
-        response = Response("", status=204)
-        for key, value in headers.items():
-            response.headers[key] = value
-        raise response
+        raise Response("", status=204, headers=headers)
 
 
 def add_cors_headers(response: Response, origin: str = None) -> Response:
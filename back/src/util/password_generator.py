@@ -1,16 +1,21 @@
 """PT-BR readable password generator."""
 
-import random
 from datetime import datetime
+from secrets import SystemRandom
 
 
-PORTUGUESE_WORDS = [
+PORTUGUESE_WORDS = (
     'casa', 'mesa', 'cafe', 'livro', 'porta', 'janela', 'carro', 'moto',
     'praia', 'sol', 'lua', 'estrela', 'flor', 'arvore', 'verde', 'azul',
     'vermelho', 'amarelo', 'branco', 'preto', 'gato', 'cachorro', 'passaro',
     'peixe', 'agua', 'fogo', 'terra', 'vento', 'pedra', 'mar', 'rio', 'lago',
     'montanha', 'vale', 'cidade', 'rua', 'ponte', 'escola', 'parque', 'jardim'
-]
+)
+
+_WORD_SET = frozenset(PORTUGUESE_WORDS)
+
+# Passwords are real credentials, so draw words from the OS CSPRNG
+_rng = SystemRandom()
 
 
 def generate_readable_password() -> str:
@@ -19,7 +24,7 @@ def generate_readable_password() -> str:
     Returns:
         Generated password string
     """
-    words = random.sample(PORTUGUESE_WORDS, 3)
+    words = _rng.sample(PORTUGUESE_WORDS, 3)
     year = datetime.now().year
     return f"{'-'.join(words)}-{year}"
 
@@ -36,6 +41,6 @@ def validate_password_strength(password: str) -> bool:
     parts = password.split('-')
     return (
         len(parts) == 4 and
-        all(word in PORTUGUESE_WORDS for word in parts[:3]) and
+        all(word in _WORD_SET for word in parts[:3]) and
         parts[3].isdigit() and len(parts[3]) == 4
     )
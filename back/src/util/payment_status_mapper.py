@@ -1,5 +1,6 @@
 """Payment status mapping utilities."""
 
+from typing import Dict, List
 from src.models.firestore_types import PaymentStatus, PaymentProvider
 
 
@@ -23,6 +24,25 @@ BTCPAY_STATUS_MAP = {
     'Invalid': PaymentStatus.FAILED
 }
 
+# Provider → status map, so mapping is a single dispatch
+_PROVIDER_STATUS_MAPS = {
+    PaymentProvider.STRIPE: STRIPE_STATUS_MAP,
+    PaymentProvider.BTCPAYSERVER: BTCPAY_STATUS_MAP
+}
+
+
+def _invert(status_map: Dict[str, PaymentStatus]) -> Dict[PaymentStatus, List[str]]:
+    """Build unified status → provider statuses lookup."""
+    inverse: Dict[PaymentStatus, List[str]] = {}
+    for provider_status, unified_status in status_map.items():
+        inverse.setdefault(unified_status, []).append(provider_status)
+    return inverse
+
+
+# Unified status → provider statuses, built once at import
+_STRIPE_INVERSE = _invert(STRIPE_STATUS_MAP)
+_BTCPAY_INVERSE = _invert(BTCPAY_STATUS_MAP)
+
 
 def map_payment_status(provider: PaymentProvider, provider_status: str) -> PaymentStatus:
     """Map provider-specific status to unified status.
@@ -34,12 +54,10 @@ def map_payment_status(provider: PaymentProvider, provider_status: str) -> Payme
     Returns:
         Unified PaymentStatus enum value
     """
-    if provider == PaymentProvider.STRIPE:
-        return STRIPE_STATUS_MAP.get(provider_status, PaymentStatus.FAILED)
-    elif provider == PaymentProvider.BTCPAYSERVER:
-        return BTCPAY_STATUS_MAP.get(provider_status, PaymentStatus.FAILED)
-    else:
+    status_map = _PROVIDER_STATUS_MAPS.get(provider)
+    if status_map is None:
         return PaymentStatus.PENDING
+    return status_map.get(provider_status, PaymentStatus.FAILED)
 
 
 def get_provider_statuses(unified_status: PaymentStatus) -> dict:
@@ -51,9 +69,7 @@ def get_provider_statuses(unified_status: PaymentStatus) -> dict:
     Returns:
         Dictionary mapping providers to their status strings
     """
-    stripe_statuses = [k for k, v in STRIPE_STATUS_MAP.items() if v == unified_status]
-    btcpay_statuses = [k for k, v in BTCPAY_STATUS_MAP.items() if v == unified_status]
     return {
-        'stripe': stripe_statuses,
-        'btcpay': btcpay_statuses
+        'stripe': list(_STRIPE_INVERSE.get(unified_status, [])),
+        'btcpay': list(_BTCPAY_INVERSE.get(unified_status, []))
     }
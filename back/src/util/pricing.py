@@ -3,6 +3,10 @@
 from src.models.firestore_types import ProductPriceDoc
 
 
+# Swap US separators for BRL ones ("1,234.56" → "1.234,56") in one pass
+_BRL_SEPARATORS = str.maketrans({',': '.', '.': ','})
+
+
 def calculate_final_price(base_price: ProductPriceDoc, mentorship_enabled: bool) -> int:
     """Calculate final price with mentorship modifier.
 
@@ -47,7 +51,7 @@ def format_brl_price(centavos: int) -> str:
         Formatted price string
     """
     reais = centavos / 100.0
-    return f"R$ {reais:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+    return f"R$ {reais:,.2f}".translate(_BRL_SEPARATORS)
 
 
 def reais_to_centavos(reais: float) -> int:
@@ -59,7 +63,8 @@ def reais_to_centavos(reais: float) -> int:
     Returns:
         Amount in centavos
     """
-    return int(reais * 100)
+    # Round rather than truncate: 1.15 * 100 == 114.99999999999999
+    return round(reais * 100)
 
 
 def centavos_to_reais(centavos: int) -> float:
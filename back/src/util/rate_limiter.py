@@ -1,8 +1,42 @@
-from datetime import datetime, timedelta
-from typing import Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
 import hashlib
+import math
+import random
+import threading
+import time
 from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random
 from src.apis.Db import Db
+from src.util.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Default token buckets: a burst of LIMIT requests, then one more every WINDOW / LIMIT
+# seconds. Per IP that is 10 at once plus one every 6 minutes (up to 20 in the
+# first hour); per email 3 at once plus one every 8 hours (up to 6 in the first day).
+IP_LIMIT = 10
+IP_WINDOW = 3600
+EMAIL_LIMIT = 3
+EMAIL_WINDOW = 86400
+
+# Seconds for one token to refill in an empty per-identity bucket
+_TOKEN_INTERVAL = {"ip": IP_WINDOW / IP_LIMIT, "email": EMAIL_WINDOW / EMAIL_LIMIT}
+
+# Maximum number of denied keys remembered in-process (LRU eviction)
+DENY_CACHE_SIZE = 10_000
+
+# Read-compute-write cycles tried before giving up on a contended bucket
+CAS_ATTEMPTS = 5
+
+# Shards per global counter minute (spreads writes across documents)
+NUM_SHARDS = 10
+
+# Recently seen IPs/emails whose document IDs are memoized (skips rehashing)
+KEY_CACHE_SIZE = 1024
 
 
 class RateLimiter:
@@ -12,226 +46,377 @@ class RateLimiter:
     Rate limit documents are stored in the 'rate_limits' collection with TTL cleanup.
     """
 
-    def __init__(self):
+    def __init__(self, now_fn: Callable[[], float] = time.time):
+        """
+        Args:
+            now_fn: Clock returning the current epoch time in seconds; tests
+                pass a fake clock to control the windows.
+        """
         self.db = Db.get_instance()
+        self._now = now_fn
+        # doc_id → epoch second until which the key is known to be blocked
+        self._deny_cache = OrderedDict()
+        self._deny_lock = threading.Lock()
+
+    def _denied_for(self, doc_id: str, now: int) -> float:
+        """Seconds the in-process deny cache still blocks a key for (0 if not blocked)."""
+        with self._deny_lock:
+            deny_until = self._deny_cache.get(doc_id)
+            if deny_until is None:
+                return 0
+            if deny_until > now:
+                self._deny_cache.move_to_end(doc_id)
+                return deny_until - now
+            del self._deny_cache[doc_id]
+            return 0
+
+    def _is_denied(self, doc_id: str, now: int) -> bool:
+        """Check the in-process deny cache for a key that is still blocked."""
+        return self._denied_for(doc_id, now) > 0
+
+    def _deny_until(self, doc_id: str, until: float) -> None:
+        """Remember that a key is blocked until the given epoch second."""
+        with self._deny_lock:
+            self._deny_cache[doc_id] = until
+            self._deny_cache.move_to_end(doc_id)
+            if len(self._deny_cache) > DENY_CACHE_SIZE:
+                self._deny_cache.popitem(last=False)
+
+    @staticmethod
+    @lru_cache(maxsize=KEY_CACHE_SIZE)
+    def _ip_doc_id(ip: str) -> str:
+        """Build the rate limit document ID for an IP (hashed for privacy).
+
+        The hash is only an opaque doc key, so a short BLAKE2b digest is enough.
+        """
+        return f"ip_{hashlib.blake2b(ip.encode(), digest_size=8).hexdigest()}"
+
+    @staticmethod
+    @lru_cache(maxsize=KEY_CACHE_SIZE)
+    def _email_doc_id(email: str) -> str:
+        """Build the rate limit document ID for a normalized, hashed email.
 
-    def check_ip_limit(self, ip: str, limit: int = 10, window: int = 3600) -> Tuple[bool, int]:
+        The hash is only an opaque doc key, so a short BLAKE2b digest is enough.
         """
-        Check IP rate limit (10 per hour default) using Firestore.
+        return f"email_{hashlib.blake2b(email.strip().casefold().encode(), digest_size=8).hexdigest()}"
+
+    def check_ip_limit(self, ip: str, limit: int = IP_LIMIT, window: int = IP_WINDOW) -> Tuple[bool, int]:
+        """
+        Check IP rate limit using Firestore.
+
+        The default bucket allows a burst of 10 and refills one request every
+        6 minutes (see _consume_tokens).
 
         Args:
             ip: IP address to check
-            limit: Maximum requests allowed in window
+            limit: Bucket capacity (burst size); refills `limit` per window
             window: Time window in seconds
 
         Returns:
             Tuple of (is_allowed, remaining_count)
         """
-        now = datetime.now()
-        window_start = now - timedelta(seconds=window)
+        return self._check_identity_limit(self._ip_doc_id(ip), limit, window, "ip")
 
-        # Hash IP for privacy
-        ip_hash = hashlib.sha256(ip.encode()).hexdigest()[:16]
-        doc_id = f"ip_{ip_hash}"
+    def check_email_limit(self, email: str, limit: int = EMAIL_LIMIT, window: int = EMAIL_WINDOW) -> Tuple[bool, int]:
+        """
+        Check email rate limit using Firestore.
 
-        rate_limit_ref = self.db.collections["rate_limits"].document(doc_id)
+        The default bucket allows a burst of 3 and refills one request every
+        8 hours (see _consume_tokens).
 
+        Args:
+            email: Email address to check
+            limit: Bucket capacity (burst size); refills `limit` per window
+            window: Time window in seconds (86400 = 1 day)
+
+        Returns:
+            Tuple of (is_allowed, remaining_count)
+        """
+        return self._check_identity_limit(self._email_doc_id(email), limit, window, "email")
+
+    def _check_identity_limit(self, doc_id: str, limit: int, window: int, type_tag: str) -> Tuple[bool, int]:
+        """
+        Check a single per-identity token bucket, failing open on errors.
+
+        Args:
+            doc_id: Rate limit document ID (already hashed)
+            limit: Bucket capacity (burst size); refills `limit` per window
+            window: Time window in seconds
+            type_tag: Limit type stored on the document ("ip" or "email")
+
+        Returns:
+            Tuple of (is_allowed, remaining_count)
+        """
         try:
-            # Use transaction to ensure atomicity
-            transaction = self.db.client.transaction()
-
-            @firestore.transactional
-            def update_in_transaction(transaction):
-                doc = rate_limit_ref.get(transaction=transaction)
-
-                if doc.exists:
-                    data = doc.to_dict()
-                    attempts = data.get("attempts", [])
-
-                    # Filter out expired attempts
-                    valid_attempts = [
-                        ts for ts in attempts
-                        if ts.replace(tzinfo=None) > window_start
-                    ]
-
-                    current_count = len(valid_attempts)
-
-                    if current_count >= limit:
-                        return False, 0
-
-                    # Add current attempt
-                    valid_attempts.append(now)
-
-                    transaction.update(rate_limit_ref, {
-                        "attempts": valid_attempts,
-                        "lastAttempt": now,
-                        "expiresAt": now + timedelta(seconds=window)
-                    })
-
-                    return True, limit - current_count - 1
-                else:
-                    # First attempt for this IP
-                    transaction.set(rate_limit_ref, {
-                        "attempts": [now],
-                        "lastAttempt": now,
-                        "expiresAt": now + timedelta(seconds=window),
-                        "type": "ip"
-                    })
-                    return True, limit - 1
-
-            return update_in_transaction(transaction)
+            results, _ = self._consume_tokens([(doc_id, limit, window, type_tag)])
+            return results[0]
 
         except Exception as e:
             # If Firestore fails, allow the request (fail open for availability)
             # Log the error for monitoring
-            print(f"Rate limiter error for IP {ip_hash}: {e}")
+            logger.warning("Rate limiter error for %s %s: %s", type_tag, doc_id, e)
             return True, limit
 
-    def check_email_limit(self, email: str, limit: int = 3, window: int = 86400) -> Tuple[bool, int]:
+    def check_all(self, ip: str, email: str) -> Dict[str, Any]:
         """
-        Check email rate limit (3 per day default) using Firestore.
+        Check IP and email rate limits (default limits) together.
+
+        Equivalent to check_ip_limit followed by check_email_limit, but both
+        buckets share each Firestore call: one batch create when neither key has
+        been seen before, otherwise three calls (the rejected create, one get_all
+        and one conditional commit) instead of three per key. As with
+        the sequential calls, the email is only checked (and consumed) when the
+        IP is allowed; otherwise it is reported as (False, 0).
 
         Args:
+            ip: IP address to check
             email: Email address to check
-            limit: Maximum requests allowed in window
-            window: Time window in seconds (86400 = 1 day)
 
         Returns:
-            Tuple of (is_allowed, remaining_count)
+            Dict with "ip" and "email" keys, each a tuple of (is_allowed, remaining_count),
+            and "retry_after": seconds until the denied bucket refills a token (0 if allowed)
         """
-        # Normalize and hash email for privacy
-        email_hash = hashlib.sha256(email.lower().strip().encode()).hexdigest()[:16]
-        doc_id = f"email_{email_hash}"
-
-        now = datetime.now()
-        window_start = now - timedelta(seconds=window)
-
-        rate_limit_ref = self.db.collections["rate_limits"].document(doc_id)
+        buckets = [
+            (self._ip_doc_id(ip), IP_LIMIT, IP_WINDOW, "ip"),
+            (self._email_doc_id(email), EMAIL_LIMIT, EMAIL_WINDOW, "email"),
+        ]
 
         try:
-            # Use transaction to ensure atomicity
-            transaction = self.db.client.transaction()
-
-            @firestore.transactional
-            def update_in_transaction(transaction):
-                doc = rate_limit_ref.get(transaction=transaction)
-
-                if doc.exists:
-                    data = doc.to_dict()
-                    attempts = data.get("attempts", [])
-
-                    # Filter out expired attempts
-                    valid_attempts = [
-                        ts for ts in attempts
-                        if ts.replace(tzinfo=None) > window_start
-                    ]
-
-                    current_count = len(valid_attempts)
-
-                    if current_count >= limit:
-                        return False, 0
-
-                    # Add current attempt
-                    valid_attempts.append(now)
-
-                    transaction.update(rate_limit_ref, {
-                        "attempts": valid_attempts,
-                        "lastAttempt": now,
-                        "expiresAt": now + timedelta(seconds=window)
-                    })
-
-                    return True, limit - current_count - 1
-                else:
-                    # First attempt for this email
-                    transaction.set(rate_limit_ref, {
-                        "attempts": [now],
-                        "lastAttempt": now,
-                        "expiresAt": now + timedelta(seconds=window),
-                        "type": "email"
-                    })
-                    return True, limit - 1
-
-            return update_in_transaction(transaction)
+            (ip_result, email_result), retry_after = self._consume_tokens(buckets)
+            return {"ip": ip_result, "email": email_result, "retry_after": retry_after}
 
         except Exception as e:
             # If Firestore fails, allow the request (fail open for availability)
-            print(f"Rate limiter error for email {email_hash}: {e}")
-            return True, limit
+            logger.warning("Rate limiter error for %s, %s: %s", buckets[0][0], buckets[1][0], e)
+            return {"ip": (True, IP_LIMIT), "email": (True, EMAIL_LIMIT), "retry_after": 0}
+
+    def _consume_tokens(self, buckets: List[Tuple[str, int, int, str]]) -> Tuple[List[Tuple[bool, int]], int]:
+        """
+        Take one token from each Firestore-backed token bucket, in order.
+
+        Each bucket holds up to `capacity` tokens and refills at `capacity / window`
+        tokens per second, so a burst of `capacity` requests is allowed and the
+        sustained rate is `capacity` per `window`. This is looser than a fixed
+        window: a full bucket admits up to 2 * `capacity` requests within the
+        first `window` (the burst plus the refill). Documents stay constant-size
+        ({tokens, lastRefill}) regardless of traffic.
+
+        expiresAt is only written when a document is created, so the TTL policy
+        deletes it one window after the key was first seen. A deleted bucket
+        comes back full, so a key that stays busy across that boundary can get
+        at most one extra burst of `capacity` before the new bucket applies.
+
+        When none of the documents exist yet they are created in one batch write,
+        a single Firestore call. Otherwise that create is rejected with
+        AlreadyExists, and all buckets are then read with one get_all and written
+        in one conditional commit (see _consume_with_precondition): returning
+        keys pay three calls, the rejected create included.
+        Processing stops at the first empty bucket: later buckets are neither read
+        nor consumed and are reported as (False, 0).
+
+        Args:
+            buckets: List of (doc_id, capacity, window, limit_type) tuples
+
+        Returns:
+            Tuple of (results, retry_after): one (is_allowed, remaining_count) tuple
+            per bucket, and the whole seconds until the first denied bucket has a
+            token again (0 when every bucket allowed the request)
+        """
+        # Integer epoch seconds: cheap to compare and stored natively as int64
+        now = int(self._now())
+
+        # Buckets up to the first one known to be blocked need Firestore
+        pending = []
+        retry_after = 0
+        for bucket in buckets:
+            retry_after = self._denied_for(bucket[0], now)
+            if retry_after:
+                break
+            pending.append(bucket)
+
+        results = [(False, 0)] * len(buckets)
+        if not pending:
+            return results, math.ceil(retry_after)
+
+        refs = [self.db.collections["rate_limits"].document(b[0]) for b in pending]
+
+        # Fast path for keys seen for the first time: create every document in
+        # one atomic batch, skipping the transaction's read. If any of them
+        # already exists the whole batch is rejected and nothing is written.
+        batch = self.db.client.batch()
+        for ref, (_, capacity, window, limit_type) in zip(refs, pending):
+            batch.create(ref, {
+                "tokens": capacity - 1,
+                "lastRefill": now,
+                "expiresAt": datetime.fromtimestamp(now + window, tz=timezone.utc),
+                "type": limit_type
+            })
+
+        try:
+            batch.commit()
+            for i, (_, capacity, _, _) in enumerate(pending):
+                results[i] = (True, capacity - 1)
+            return results, math.ceil(retry_after)
+        except AlreadyExists:
+            pass
+
+        outcomes = self._consume_with_precondition(pending, refs, now)
+
+        for i, (allowed, tokens) in enumerate(outcomes):
+            if allowed:
+                results[i] = (True, int(tokens))
+            else:
+                # Blocked until one token has refilled
+                doc_id, capacity, window, _ = pending[i]
+                retry_after = (1 - tokens) * window / capacity
+                self._deny_until(doc_id, now + retry_after)
+
+        return results, math.ceil(retry_after)
+
+    @retry(
+        retry=retry_if_exception_type((FailedPrecondition, AlreadyExists)),
+        stop=stop_after_attempt(CAS_ATTEMPTS),
+        wait=wait_random(0, 0.05),
+        reraise=True
+    )
+    def _consume_with_precondition(self, pending: List[Tuple[str, int, int, str]], refs: list, now: int) -> List[Tuple[bool, float]]:
+        """
+        Read the buckets, then write their new state as one conditional batch.
+
+        Existing documents are only updated if they have not changed since the
+        read (last_update_time precondition) and missing ones are created, so a
+        concurrent writer makes the whole batch fail with FailedPrecondition or
+        AlreadyExists and the read-compute-write cycle is retried.
+
+        Args:
+            pending: List of (doc_id, capacity, window, limit_type) tuples
+            refs: Document references matching `pending`
+            now: Current epoch second
+
+        Returns:
+            List of (is_allowed, tokens_left) tuples, up to the first denied bucket
+        """
+        snapshots = {snap.id: snap for snap in self.db.client.get_all(refs)}
+        batch = self.db.client.batch()
+        outcomes = []
+
+        for ref, (doc_id, capacity, window, limit_type) in zip(refs, pending):
+            refill_per_sec = capacity / window
+            snap = snapshots.get(doc_id)
+
+            tokens = capacity
+            exists = snap is not None and snap.exists
+            if exists:
+                data = snap.to_dict()
+                elapsed = max(0, now - int(data.get("lastRefill", now)))
+                tokens = min(capacity, data.get("tokens", capacity) + elapsed * refill_per_sec)
+
+            if tokens < 1:
+                outcomes.append((False, tokens))
+                break
+
+            tokens -= 1
+            if exists:
+                # expiresAt is left as first written (see _consume_tokens)
+                batch.update(
+                    ref,
+                    {"tokens": tokens, "lastRefill": now},
+                    option=self.db.client.write_option(last_update_time=snap.update_time)
+                )
+            else:
+                batch.create(ref, {
+                    "tokens": tokens,
+                    "lastRefill": now,
+                    "expiresAt": datetime.fromtimestamp(now + window, tz=timezone.utc),
+                    "type": limit_type
+                })
+            outcomes.append((True, tokens))
+
+        if outcomes[0][0]:
+            batch.commit()
+
+        return outcomes
 
     def check_global_limit(self, limit: int = 100) -> Tuple[bool, int]:
         """
         Check global rate limit (100 per minute default) using Firestore.
 
+        The minute's counter is sharded over NUM_SHARDS documents so no single
+        document takes every write. Each call increments one random shard with
+        a blind write (no transaction) and then sums all shards with one
+        get_all. Once a minute is known to be exhausted, further calls in that
+        minute are denied from the in-process deny cache without touching
+        Firestore.
+
         Args:
             limit: Maximum requests allowed per minute
 
         Returns:
             Tuple of (is_allowed, remaining_count)
         """
-        now = datetime.now()
-        current_minute = now.replace(second=0, microsecond=0)
-        doc_id = f"global_{current_minute.strftime('%Y%m%d_%H%M')}"
+        # Minute bucket from integer division: one set of shards per epoch minute
+        now = int(self._now())
+        current_minute = now // 60
+        minute_key = f"global_{current_minute}"
+
+        if self._is_denied(minute_key, now):
+            return False, 0
 
-        rate_limit_ref = self.db.collections["rate_limits"].document(doc_id)
+        shard_refs = [
+            self.db.collections["rate_limits"].document(f"{minute_key}_{shard}")
+            for shard in range(NUM_SHARDS)
+        ]
 
         try:
-            # Use transaction to ensure atomicity
-            transaction = self.db.client.transaction()
-
-            @firestore.transactional
-            def update_in_transaction(transaction):
-                doc = rate_limit_ref.get(transaction=transaction)
-
-                if doc.exists:
-                    data = doc.to_dict()
-                    count = data.get("count", 0)
-
-                    if count >= limit:
-                        return False, 0
-
-                    transaction.update(rate_limit_ref, {
-                        "count": firestore.Increment(1),
-                        "lastAttempt": now
-                    })
-
-                    return True, limit - count - 1
-                else:
-                    # First request in this minute
-                    transaction.set(rate_limit_ref, {
-                        "count": 1,
-                        "lastAttempt": now,
-                        "expiresAt": current_minute + timedelta(minutes=2),
-                        "type": "global"
-                    })
-                    return True, limit - 1
-
-            return update_in_transaction(transaction)
+            random.choice(shard_refs).set({
+                "count": firestore.Increment(1),
+                "lastAttempt": now,
+                "expiresAt": datetime.fromtimestamp((current_minute + 2) * 60, tz=timezone.utc),
+                "type": "global"
+            }, merge=True)
+
+            count = sum(
+                snap.to_dict().get("count", 0)
+                for snap in self.db.client.get_all(shard_refs)
+                if snap.exists
+            )
+
+            if count > limit:
+                self._deny_until(minute_key, (current_minute + 1) * 60)
+                return False, 0
+
+            return True, limit - count
 
         except Exception as e:
             # If Firestore fails, allow the request (fail open for availability)
-            print(f"Rate limiter error for global limit: {e}")
+            logger.warning("Rate limiter error for global limit: %s", e)
             return True, limit
 
     def get_retry_after(self, window_type: str = "ip") -> int:
         """
-        Get the number of seconds until rate limit resets.
+        Get the number of seconds until a blocked caller can retry.
+
+        For "ip" and "email" this is the time one token takes to refill in an
+        empty default bucket, an upper bound; check_all reports the exact wait
+        for the bucket that denied a request.
 
         Args:
             window_type: Type of window ("ip", "email", or "global")
 
         Returns:
-            Seconds until rate limit window resets
+            Seconds until a request can be allowed again
         """
-        if window_type == "ip":
-            return 3600  # 1 hour
-        elif window_type == "email":
-            return 86400  # 1 day
-        else:
-            # Global rate limit resets every minute
-            now = datetime.now()
-            seconds_into_minute = now.second
-            return max(1, 60 - seconds_into_minute)
+        interval = _TOKEN_INTERVAL.get(window_type)
+        if interval is not None:
+            return math.ceil(interval)
+
+        # Global rate limit resets every minute
+        return max(1, 60 - int(self._now()) % 60)
 
 
-# Singleton instance for the application
-rate_limiter = RateLimiter()
\ No newline at end of file
+# Built on first use so cold starts of endpoints that never rate-limit don't
+# pay for it; one instance per warm function instance keeps the deny cache.
+@lru_cache(maxsize=1)
+def get_rate_limiter() -> RateLimiter:
+    """Get the shared RateLimiter instance."""
+    return RateLimiter()
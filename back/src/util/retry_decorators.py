@@ -1,14 +1,16 @@
 """Retry decorators for transient error handling.
 
 This module provides retry decorators using the Tenacity library for handling
-transient errors in external service operations, particularly Firestore operations.
+transient errors in external service operations, particularly Firestore and Stripe operations.
 """
 
+import stripe
+
 from tenacity import (
     retry,
     stop_after_attempt,
     stop_after_delay,
-    wait_exponential,
+    wait_exponential_jitter,
     retry_if_exception_type,
     RetryCallState,
 )
@@ -36,6 +38,19 @@ def _log_retry_attempt(retry_state: RetryCallState) -> None:
     )
 
 
+def _log_stripe_retry_attempt(retry_state: RetryCallState) -> None:
+    """Log Stripe retry attempts with context.
+
+    Args:
+        retry_state: Tenacity retry state object containing attempt info
+    """
+    exception = retry_state.outcome.exception() if retry_state.outcome else None
+    logger.warning(
+        f"Stripe operation failed, retrying (attempt {retry_state.attempt_number}): "
+        f"{type(exception).__name__}: {exception}"
+    )
+
+
 # Retry decorator for Firestore operations
 # CRITICAL: Only retries on transient errors (DeadlineExceeded, ServiceUnavailable, ResourceExhausted)
 # Does NOT retry on permanent errors (PermissionDenied, InvalidArgument, NotFound)
@@ -46,7 +61,24 @@ retry_firestore_operation = retry(
         ResourceExhausted,     # Rate limit or quota exceeded
     )),
     stop=(stop_after_attempt(3) | stop_after_delay(25)),  # Max 3 attempts OR 25 seconds
-    wait=wait_exponential(multiplier=1, min=1, max=10),   # 1s, 2s, 4s, 8s, 10s...
+    # ~0.1s, 0.2s, 0.4s... capped at 2s, plus up to 0.1s jitter against thundering herds
+    wait=wait_exponential_jitter(initial=0.1, max=2, exp_base=2, jitter=0.1),
     before_sleep=_log_retry_attempt,
     reraise=True  # Re-raise exception if all retries exhausted
 )
+
+
+# Retry decorator for Stripe API calls
+# Only retries on connection failures and rate limiting; request errors
+# (InvalidRequestError, AuthenticationError, CardError) fail immediately
+retry_stripe_operation = retry(
+    retry=retry_if_exception_type((
+        stripe.APIConnectionError,  # Network failure reaching Stripe
+        stripe.RateLimitError,      # 429 from Stripe
+    )),
+    stop=stop_after_attempt(5),
+    # ~0.5s, 1s, 2s, 4s capped at 8s, plus jitter so parallel callers spread out
+    wait=wait_exponential_jitter(initial=0.5, max=8),
+    before_sleep=_log_stripe_retry_attempt,
+    reraise=True
+)
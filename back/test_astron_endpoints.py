@@ -1,15 +1,76 @@
 """Test different Astron Members API endpoint variations."""
 
+import asyncio
 import os
 import sys
-import requests
-from requests.auth import HTTPBasicAuth
+import httpx
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from dotenv import load_dotenv
 load_dotenv()
 
+
+async def _probe(client, base_url, path, params):
+    """Probe one endpoint variation, returning the response or the error."""
+    try:
+        return base_url, path, await client.get(f"{base_url}{path}", params=params)
+    except Exception as e:
+        return base_url, path, e
+
+
+async def _find_endpoint(candidates, params, auth):
+    """Probe all variations concurrently and report each result as it arrives.
+
+    All probes are multiplexed as HTTP/2 streams over a single connection to the
+    host. Returns True as soon as one variation answers with a 2xx status.
+    """
+    async with httpx.AsyncClient(http2=True, auth=auth, timeout=5) as client:
+        tasks = [
+            asyncio.create_task(_probe(client, base_url, path, params))
+            for base_url, path in candidates
+        ]
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                base_url, path, outcome = await next_done
+                url = f"{base_url}{path}"
+                print(f"\nTried: {url}")
+
+                try:
+                    if isinstance(outcome, Exception):
+                        raise outcome
+                    response = outcome
+
+                    print(f"  Status: {response.status_code}")
+
+                    if response.status_code in [200, 201]:
+                        print(f"  ✅ SUCCESS!")
+                        print(f"  Response: {response.text[:200]}")
+                        print(f"\n{'='*70}")
+                        print(f"WORKING ENDPOINT FOUND:")
+                        print(f"  Base URL: {base_url}")
+                        print(f"  Path: {path}")
+                        print(f"{'='*70}")
+                        return True
+                    elif response.status_code == 404:
+                        print(f"  ❌ Not Found: {response.json() if response.text else 'Empty'}")
+                    elif response.status_code == 401:
+                        print(f"  ❌ Unauthorized (auth may be wrong)")
+                    else:
+                        print(f"  ⚠️  Status {response.status_code}: {response.text[:100]}")
+
+                except Exception as e:
+                    print(f"  ❌ Error: {str(e)[:50]}")
+
+            return False
+
+        finally:
+            # Stop outstanding probes before the client closes
+            for task in tasks:
+                task.cancel()
+
+
 def test_endpoints():
     """Test different endpoint variations to find the correct one."""
 
@@ -20,7 +81,7 @@ def test_endpoints():
         print("❌ Missing credentials!")
         return
 
-    auth = HTTPBasicAuth(am_key, am_secret)
+    auth = httpx.BasicAuth(am_key, am_secret)
     params = {
         'am_key': am_key,
         'am_secret': am_secret
@@ -46,39 +107,10 @@ def test_endpoints():
     print("TESTING ASTRON MEMBERS API ENDPOINT VARIATIONS")
     print("=" * 70)
 
-    for base_url in base_urls:
-        for path in paths:
-            url = f"{base_url}{path}"
-            print(f"\nTrying: {url}")
-
-            try:
-                response = requests.get(
-                    url,
-                    params=params,
-                    auth=auth,
-                    timeout=5
-                )
-
-                print(f"  Status: {response.status_code}")
-
-                if response.status_code in [200, 201]:
-                    print(f"  ✅ SUCCESS!")
-                    print(f"  Response: {response.text[:200]}")
-                    print(f"\n{'='*70}")
-                    print(f"WORKING ENDPOINT FOUND:")
-                    print(f"  Base URL: {base_url}")
-                    print(f"  Path: {path}")
-                    print(f"{'='*70}")
-                    return
-                elif response.status_code == 404:
-                    print(f"  ❌ Not Found: {response.json() if response.text else 'Empty'}")
-                elif response.status_code == 401:
-                    print(f"  ❌ Unauthorized (auth may be wrong)")
-                else:
-                    print(f"  ⚠️  Status {response.status_code}: {response.text[:100]}")
-
-            except Exception as e:
-                print(f"  ❌ Error: {str(e)[:50]}")
+    candidates = [(base_url, path) for base_url in base_urls for path in paths]
+
+    if asyncio.run(_find_endpoint(candidates, params, auth)):
+        return
 
     print(f"\n{'='*70}")
     print("❌ NO WORKING ENDPOINT FOUND")
@@ -1,8 +1,17 @@
 """Comprehensive manual test of Astron Members API integration."""
 
+import contextlib
+import io
+import logging
 import os
 import sys
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -14,8 +23,52 @@ load_dotenv()
 # Import the service
 from src.services.astron_members_service import AstronMembersService
 
+logger = logging.getLogger('astron_test')
+
+# Suffix for generated test user emails/names
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+# (connect, read) timeouts so a dead Astron node fails fast instead of hanging
+ASTRON_TIMEOUT = (3.05, 10)
+
+# Retry connection failures and transient gateway/throttling responses. Status
+# retries are limited to GET so user-creating POSTs are never sent twice.
+RETRY = Retry(
+    total=3,
+    connect=2,
+    read=2,
+    backoff_factor=0.3,
+    status_forcelist=(429, 502, 503, 504),
+    allowed_methods=frozenset(['GET'])
+)
+
+# print() output is collected here (see __main__) and written to the terminal
+# once per section instead of once per line
+_TERMINAL = sys.stdout
+_OUTPUT = io.StringIO()
+_OUTPUT_LOCK = threading.Lock()
+
+def flush_output():
+    """Write the buffered output to the terminal in a single write."""
+    with _OUTPUT_LOCK:
+        text = _OUTPUT.getvalue()
+        _OUTPUT.seek(0)
+        _OUTPUT.truncate()
+    if text:
+        _TERMINAL.write(text)
+        _TERMINAL.flush()
+
+def prompt(message):
+    """Flush buffered output, then ask the user for input."""
+    flush_output()
+    # input() would write the prompt to the redirected stdout, so write it here
+    _TERMINAL.write(message)
+    _TERMINAL.flush()
+    return input()
+
 def print_section(title):
-    """Print a formatted section header."""
+    """Print a formatted section header, flushing the previous section."""
+    flush_output()
     print("\n" + "=" * 70)
     print(f"  {title}")
     print("=" * 70)
@@ -25,7 +78,12 @@ def test_initialization():
     print_section("TEST 1: Service Initialization")
 
     try:
-        service = AstronMembersService()
+        # One pooled session shared by every test, so each call reuses an open
+        # connection instead of paying a fresh TCP + TLS handshake
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=RETRY))
+
+        service = AstronMembersService(session=session)
         print("✅ Service initialized successfully")
         print(f"   Base URL: {service.base_url}")
         print(f"   AM Key: {service.am_key[:10]}...")
@@ -40,8 +98,7 @@ def test_list_clubs(service):
     print_section("TEST 2: List Clubs (Authentication Test)")
 
     try:
-        import requests
-        response = requests.get(
+        response = service.session.get(
             f"{service.base_url}/listClubs",
             params={
                 'am_key': service.am_key,
@@ -49,7 +106,7 @@ def test_list_clubs(service):
                 'limit': 10
             },
             auth=service.auth,
-            timeout=10
+            timeout=ASTRON_TIMEOUT
         )
 
         print(f"Status Code: {response.status_code}")
@@ -75,9 +132,7 @@ def test_list_clubs(service):
             return None
 
     except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error: %s", e)
         return None
 
 def test_get_user_by_email(service, test_email="test@example.com", club_id=None):
@@ -102,9 +157,7 @@ def test_get_user_by_email(service, test_email="test@example.com", club_id=None)
             return None
 
     except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error: %s", e)
         return None
 
 def test_create_user(service, club_id):
@@ -112,7 +165,7 @@ def test_create_user(service, club_id):
     print_section("TEST 4: Create User (DRY RUN)")
 
     # Generate test user data
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = time.strftime(TIMESTAMP_FORMAT)
     test_email = f"test_astron_{timestamp}@example.com"
     test_name = f"Test User {timestamp}"
     test_password = "TestPassword123!"
@@ -124,10 +177,11 @@ def test_create_user(service, club_id):
     print(f"   Club ID: {club_id}")
 
     print(f"\n⚠️  This would create a REAL user in Astron Members!")
-    response = input("\nProceed with user creation? (yes/no): ").strip().lower()
+    # Opt in with ASTRON_CREATE_USER=yes so the script can run unattended
+    response = os.environ.get('ASTRON_CREATE_USER', 'no').strip().lower()
 
     if response != 'yes':
-        print("ℹ️  Skipped user creation test")
+        print("ℹ️  Skipped user creation test (set ASTRON_CREATE_USER=yes to run it)")
         return None
 
     try:
@@ -151,9 +205,7 @@ def test_create_user(service, club_id):
         }
 
     except Exception as e:
-        print(f"❌ Error creating user: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error creating user: %s", e)
         return None
 
 def test_generate_magic_link(service, user_data):
@@ -177,9 +229,7 @@ def test_generate_magic_link(service, user_data):
         return magic_url
 
     except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error: %s", e)
         return None
 
 def test_verify_access(service, user_data, club_id):
@@ -204,13 +254,21 @@ def test_verify_access(service, user_data, club_id):
         return has_access
 
     except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error: %s", e)
         return None
 
 def main():
     """Run all tests."""
+    # Own handler rather than logging.basicConfig: the service's loggers have
+    # their own handlers and a root handler would print their records twice.
+    # It writes to the current stdout, which is the section buffer under
+    # __main__, so errors stay in order with the section they belong to.
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
     print("\n" + "=" * 70)
     print("  ASTRON MEMBERS API - COMPREHENSIVE MANUAL TEST")
     print("=" * 70)
@@ -218,7 +276,8 @@ def main():
     print("Some tests will make REAL API calls and create REAL data.")
     print("\nMake sure you're ready before proceeding!")
 
-    input("\nPress Enter to start testing...")
+    if sys.stdin.isatty():
+        prompt("\nPress Enter to start testing...")
 
     # Test 1: Initialize service
     service = test_initialization()
@@ -240,19 +299,23 @@ def main():
 
     print(f"\n📋 Using Club ID {club_id} for remaining tests")
 
-    # Test 3: Get user by email (should not exist)
-    test_get_user_by_email(service, "nonexistent@example.com", club_id)
-
     # Test 4: Create user (optional, requires confirmation)
     user_data = test_create_user(service, club_id)
 
-    # Test 5: Generate magic link
-    if user_data:
-        test_generate_magic_link(service, user_data)
+    # Tests 3, 5 and 6 are independent round trips, so run them concurrently
+    # over the shared session (their output may interleave)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        # Test 3: Get user by email (should not exist)
+        stages = [executor.submit(test_get_user_by_email, service, "nonexistent@example.com", club_id)]
 
-    # Test 6: Verify access
-    if user_data:
-        test_verify_access(service, user_data, club_id)
+        if user_data:
+            # Test 5: Generate magic link
+            stages.append(executor.submit(test_generate_magic_link, service, user_data))
+            # Test 6: Verify access
+            stages.append(executor.submit(test_verify_access, service, user_data, club_id))
+
+        for stage in stages:
+            stage.result()
 
     # Summary
     print_section("TEST SUMMARY")
@@ -276,13 +339,17 @@ def main():
 
 if __name__ == "__main__":
     try:
-        success = main()
+        with contextlib.redirect_stdout(_OUTPUT):
+            try:
+                success = main()
+            finally:
+                flush_output()
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
         print("\n\n⚠️  Test interrupted by user")
         sys.exit(1)
     except Exception as e:
-        print(f"\n\n❌ Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("\n\n❌ Unexpected error: %s", e)
+        # The handler writes to the section buffer
+        flush_output()
         sys.exit(1)
@@ -86,6 +86,35 @@ def db(firebase_app):
     return Db.get_instance()
 
 
+# (connect, read) timeouts for emulator calls; reads allow for function cold starts
+HTTP_TIMEOUT = (1, 30)
+
+
+@pytest.fixture(scope="session")
+def http_timeout():
+    """Get the (connect, read) timeouts used for emulator calls."""
+    return HTTP_TIMEOUT
+
+
+@pytest.fixture(scope="session")
+def http():
+    """Get an HTTP session shared by the whole test run.
+
+    Reuses keep-alive connections to the emulator instead of opening a new
+    one per request. Every request defaults to HTTP_TIMEOUT unless it passes
+    its own timeout.
+    """
+    import functools
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+    session.request = functools.partial(session.request, timeout=HTTP_TIMEOUT)
+    yield session
+    session.close()
+
+
 @pytest.fixture
 def test_user_id():
     """Get a test user ID."""
@@ -1,14 +1,21 @@
 """Integration tests for ActiveCampaign service."""
 
+import json
 import pytest
+import responses
 from unittest.mock import Mock, patch, MagicMock
+from src.services import activecampaign_service
 from src.services.activecampaign_service import ActiveCampaignService
 from src.exceptions.CustomError import ExternalServiceError
 
 
+AC_BASE_URL = "https://testaccount.api-us1.com/api/3"
+
+
 @pytest.fixture
 def ac_service():
     """Create ActiveCampaignService with mocked environment."""
+    activecampaign_service._id_cache.clear()
     with patch.dict('os.environ', {
         'ACTIVECAMPAIGN_ACCOUNT': 'testaccount',
         'ACTIVECAMPAIGN_API_KEY': 'test_api_key_12345',
@@ -21,30 +28,32 @@ def ac_service():
 class TestActiveCampaignService:
     """Test ActiveCampaign service integration."""
 
+    @responses.activate
     def test_sync_contact_success(self, ac_service):
         """Test successful contact sync."""
-        with patch('requests.request') as mock_request:
-            mock_response = Mock()
-            mock_response.json.return_value = {
+        responses.add(
+            responses.POST,
+            f"{AC_BASE_URL}/contact/sync",
+            json={
                 'contact': {
                     'id': '123',
                     'email': '[email protected]',
                     'firstName': 'Test',
                     'lastName': 'User'
                 }
-            }
-            mock_response.raise_for_status = Mock()
-            mock_request.return_value = mock_response
+            },
+            status=200
+        )
 
-            contact_id = ac_service.sync_contact('[email protected]', 'Test', 'User', '+5511988887777')
+        contact_id = ac_service.sync_contact('[email protected]', 'Test', 'User', '+5511988887777')
 
-            assert contact_id == '123'
-            mock_request.assert_called_once()
-            call_args = mock_request.call_args
-            assert call_args[1]['json']['contact']['email'] == '[email protected]'
-            assert call_args[1]['json']['contact']['firstName'] == 'Test'
-            assert call_args[1]['json']['contact']['lastName'] == 'User'
-            assert call_args[1]['json']['contact']['phone'] == '+5511988887777'
+        assert contact_id == '123'
+        assert len(responses.calls) == 1
+        body = json.loads(responses.calls[0].request.body)
+        assert body['contact']['email'] == '[email protected]'
+        assert body['contact']['firstName'] == 'Test'
+        assert body['contact']['lastName'] == 'User'
+        assert body['contact']['phone'] == '+5511988887777'
 
     def test_sync_contact_api_error(self, ac_service):
         """Test handling of API errors."""
@@ -64,22 +73,46 @@ class TestActiveCampaignService:
             with pytest.raises(ExternalServiceError):
                 ac_service.sync_contact('[email protected]', 'Test', 'User')
 
+    @responses.activate
     def test_get_tag_id_found(self, ac_service):
         """Test finding existing tag."""
-        with patch('requests.request') as mock_request:
-            mock_response = Mock()
-            mock_response.json.return_value = {
+        responses.add(
+            responses.GET,
+            f"{AC_BASE_URL}/tags",
+            json={
                 'tags': [
                     {'id': '16', 'tag': 'Ebook Downloaded'},
                     {'id': '17', 'tag': 'Newsletter'}
                 ]
+            },
+            status=200
+        )
+
+        tag_id = ac_service.get_tag_id('Ebook Downloaded')
+
+        assert tag_id == '16'
+
+    def test_get_tag_id_cached(self, ac_service):
+        """Test repeated lookups of the same tag hit the API only once."""
+        import time
+
+        with patch('requests.request') as mock_request:
+            mock_response = Mock()
+            mock_response.json.return_value = {
+                'tags': [{'id': '16', 'tag': 'Ebook Downloaded'}]
             }
             mock_response.raise_for_status = Mock()
             mock_request.return_value = mock_response
 
-            tag_id = ac_service.get_tag_id('Ebook Downloaded')
+            assert ac_service.get_tag_id('Ebook Downloaded') == '16'
+
+            start_time = time.time()
+            assert ac_service.get_tag_id('ebook downloaded') == '16'
+            elapsed = time.time() - start_time
 
-            assert tag_id == '16'
+            assert mock_request.call_count == 1
+            # Cached lookups skip the request and its rate-limit delay
+            assert elapsed < 0.05
 
     def test_get_tag_id_not_found(self, ac_service):
         """Test tag not found returns None."""
@@ -106,22 +139,22 @@ class TestActiveCampaignService:
 
             assert "not found in ActiveCampaign" in str(exc_info.value)
 
+    @responses.activate
     def test_add_tag_to_contact_success(self, ac_service):
         """Test adding tag to contact."""
-        with patch('requests.request') as mock_request:
-            mock_response = Mock()
-            mock_response.json.return_value = {
-                'contactTag': {'id': '1', 'contact': '123', 'tag': '16'}
-            }
-            mock_response.raise_for_status = Mock()
-            mock_request.return_value = mock_response
+        responses.add(
+            responses.POST,
+            f"{AC_BASE_URL}/contactTags",
+            json={'contactTag': {'id': '1', 'contact': '123', 'tag': '16'}},
+            status=200
+        )
 
-            result = ac_service.add_tag_to_contact('123', '16')
+        result = ac_service.add_tag_to_contact('123', '16')
 
-            assert result is True
-            call_args = mock_request.call_args
-            assert call_args[1]['json']['contactTag']['contact'] == '123'
-            assert call_args[1]['json']['contactTag']['tag'] == '16'
+        assert result is True
+        body = json.loads(responses.calls[0].request.body)
+        assert body['contactTag']['contact'] == '123'
+        assert body['contactTag']['tag'] == '16'
 
     def test_process_lead_complete_workflow(self, ac_service):
         """Test complete lead processing workflow."""
@@ -139,6 +172,34 @@ class TestActiveCampaignService:
             mock_tag.assert_called_once()
             mock_add.assert_called_once_with('123', '16')
 
+    def test_process_lead_batched(self, ac_service):
+        """Test batched lead processing sends a single request."""
+        import time
+
+        with patch.object(ac_service, 'get_list_id_by_name', return_value='5'), \
+             patch('requests.request') as mock_request:
+            mock_response = Mock()
+            mock_response.json.return_value = {'success': 1, 'queued_contacts': 1, 'batchId': 'abc-123'}
+            mock_response.raise_for_status = Mock()
+            mock_request.return_value = mock_response
+
+            start_time = time.time()
+            result = ac_service.process_lead_batched('[email protected]', 'Test User', '+5511988887777', 'https://example.com/dl')
+            elapsed = time.time() - start_time
+
+            assert result == {'success': True, 'batch_id': 'abc-123', 'list_id': '5'}
+            assert mock_request.call_count == 1
+            assert elapsed < 0.25
+
+            contact = mock_request.call_args[1]['json']['contacts'][0]
+            assert mock_request.call_args[1]['url'].endswith('/import/bulk_import')
+            assert contact['email'] == '[email protected]'
+            assert contact['first_name'] == 'Test'
+            assert contact['last_name'] == 'User'
+            assert contact['tags'] == [ac_service.ebook_tag_name]
+            assert contact['subscribe'] == [{'listid': '5'}]
+            assert contact['fields'] == [{'id': ac_service.download_field_id, 'value': 'https://example.com/dl'}]
+
     def test_process_lead_name_parsing(self, ac_service):
         """Test name parsing in process_lead."""
         with patch.object(ac_service, 'sync_contact', return_value='123') as mock_sync, \
@@ -154,25 +215,25 @@ class TestActiveCampaignService:
             mock_sync.assert_called_with(email='[email protected]', first_name='John', last_name='', phone='')
 
     def test_rate_limiting(self, ac_service):
-        """Test that rate limiting delays are applied."""
-        import time
-
-        with patch('requests.request') as mock_request:
+        """Test that only requests beyond the burst are delayed."""
+        with patch('src.services.activecampaign_service.time.sleep') as mock_sleep, \
+             patch('requests.request') as mock_request:
             mock_response = Mock()
             mock_response.json.return_value = {'tags': []}
             mock_response.raise_for_status = Mock()
             mock_request.return_value = mock_response
 
-            start_time = time.time()
+            # First 5 requests fit in the burst
+            for i in range(5):
+                ac_service.get_tag_id(f'Tag{i}')
 
-            # Make two requests
-            ac_service.get_tag_id('Tag1')
-            ac_service.get_tag_id('Tag2')
+            mock_sleep.assert_not_called()
 
-            elapsed = time.time() - start_time
+            # 6th request has to wait for a token
+            ac_service.get_tag_id('Tag5')
 
-            # Should have at least 200ms delay between requests
-            assert elapsed >= 0.2
+            mock_sleep.assert_called_once()
+            assert mock_sleep.call_args[0][0] == pytest.approx(0.2, abs=0.05)
 
     def test_service_initialization_missing_credentials(self):
         """Test service raises error when credentials are missing."""
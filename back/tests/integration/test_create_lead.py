@@ -1,44 +1,86 @@
 """Integration tests for create_lead HTTPS endpoint."""
 
 import pytest
-import requests
 import json
+import orjson
 from unittest.mock import patch, MagicMock
 from datetime import datetime
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Request bodies shared by several tests, serialized once at import
+_BASE = {"name": "João Silva", "email": "joao@example.com", "recaptchaToken": "mock-token"}
+_BASE_BYTES = orjson.dumps(_BASE)
+_INVALID_EMAIL_BYTES = orjson.dumps({**_BASE, "email": "invalid-email"})
+_FACEBOOK_BYTES = orjson.dumps({**_BASE, "utm_source": "facebook"})
+_GOOGLE_UPDATED_BYTES = orjson.dumps({**_BASE, "name": "João Silva Updated", "utm_source": "google"})
+
+
+def _json(response):
+    """Parse a response body with orjson (reads the raw bytes, no str decode)."""
+    return orjson.loads(response.content)
+
 
 @pytest.mark.integration
 class TestCreateLeadEndpoint:
     """Test the create_lead HTTPS endpoint."""
+
+    @pytest.fixture
+    def mock_recaptcha(self):
+        """Patch reCAPTCHA verification to return a passing score (0.8) by default."""
+        with patch('src.brokers.https.create_lead._verify_recaptcha') as mock_recaptcha:
+            mock_recaptcha.return_value = 0.8
+            yield mock_recaptcha
     
-    def test_create_lead_success(self, firebase_emulator, db):
+    @pytest.fixture
+    def reset_rate_limits(self, db):
+        """Delete the Firestore rate limit buckets for the given IPs and emails, now and after the test.
+
+        The handler runs in the Functions emulator, so its limiter state lives in
+        the rate_limits collection rather than in this process.
+        """
+        from src.util.rate_limiter import RateLimiter
+        doc_ids = []
+
+        def delete_buckets():
+            batch = db.firestore.batch()
+            for doc_id in doc_ids:
+                batch.delete(db.collections["rate_limits"].document(doc_id))
+            batch.commit()
+
+        def reset(ips=(), emails=()):
+            doc_ids.extend(RateLimiter._ip_doc_id(ip) for ip in ips)
+            doc_ids.extend(RateLimiter._email_doc_id(email) for email in emails)
+            delete_buckets()
+
+        yield reset
+        if doc_ids:
+            delete_buckets()
+    
+    def test_create_lead_success(self, firebase_emulator, mock_recaptcha, db, http):
         """Test successful lead creation with valid data."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
         
-        # Mock reCAPTCHA verification to return high score
-        with patch('src.brokers.https.create_lead._verify_recaptcha') as mock_recaptcha:
-            mock_recaptcha.return_value = 0.8
-            
-            response = requests.post(
-                url,
-                json={
-                    "name": "João Silva",
-                    "email": "joao@example.com",
-                    "phone": "+55 11 99999-9999",
-                    "recaptchaToken": "mock-token",
-                    "utm_source": "google",
-                    "utm_medium": "cpc",
-                    "utm_campaign": "bitcoin-book",
-                    "referrer": "https://google.com",
-                    "consent": {
-                        "lgpdConsent": True
-                    }
-                },
-                headers={"Content-Type": "application/json"}
-            )
+        response = http.post(
+            url,
+            json={
+                "name": "João Silva",
+                "email": "joao@example.com",
+                "phone": "+55 11 99999-9999",
+                "recaptchaToken": "mock-token",
+                "utm_source": "google",
+                "utm_medium": "cpc",
+                "utm_campaign": "bitcoin-book",
+                "referrer": "https://google.com",
+                "consent": {
+                    "lgpdConsent": True
+                }
+            },
+            headers={"Content-Type": "application/json"}
+        )
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert data["success"] is True
         assert "leadId" in data
         
@@ -58,11 +100,11 @@ class TestCreateLeadEndpoint:
         assert lead_data["recaptchaScore"] == 0.8
         assert lead_data["download"]["count24h"] == 0
     
-    def test_create_lead_missing_required_fields(self, firebase_emulator):
+    def test_create_lead_missing_required_fields(self, firebase_emulator, http):
         """Test lead creation with missing required fields."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
         
-        response = requests.post(
+        response = http.post(
             url,
             json={
                 "name": "João Silva",
@@ -72,135 +114,87 @@ class TestCreateLeadEndpoint:
         )
         
         assert response.status_code == 400
-        data = response.json()
+        data = _json(response)
         assert "error" in data
         assert data["code"] == "missing_fields"
         assert "email" in data["error"]
         assert "recaptchaToken" in data["error"]
     
-    def test_create_lead_invalid_email(self, firebase_emulator):
-        """Test lead creation with invalid email format."""
+    @pytest.mark.parametrize("body,score,code", [
+        pytest.param(_INVALID_EMAIL_BYTES, 0.8, "invalid_email", id="bad_email"),
+        pytest.param(_BASE_BYTES, 0.1, "recaptcha_failed", id="low_score"),  # Below threshold of 0.3
+    ])
+    def test_create_lead_rejected(self, firebase_emulator, mock_recaptcha, http, body, score, code):
+        """Test lead creation is rejected for an invalid email or low reCAPTCHA score."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
-        
-        with patch('src.brokers.https.create_lead._verify_recaptcha') as mock_recaptcha:
-            mock_recaptcha.return_value = 0.8
-            
-            response = requests.post(
-                url,
-                json={
-                    "name": "João Silva",
-                    "email": "invalid-email",
-                    "recaptchaToken": "mock-token"
-                },
-                headers={"Content-Type": "application/json"}
-            )
-        
+        mock_recaptcha.return_value = score
+
+        response = http.post(url, data=body, headers=JSON_HEADERS)
+
         assert response.status_code == 400
-        data = response.json()
-        assert data["code"] == "invalid_email"
+        data = _json(response)
+        assert data["code"] == code
+        if code == "recaptcha_failed":
+            assert "Security verification failed" in data["error"]
     
-    def test_create_lead_low_recaptcha_score(self, firebase_emulator):
-        """Test lead creation with low reCAPTCHA score."""
+    def test_create_lead_update_existing_lead(self, firebase_emulator, mock_recaptcha, db, http):
+        """Test updating an existing lead with same email."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
         
-        # Mock reCAPTCHA verification to return low score
-        with patch('src.brokers.https.create_lead._verify_recaptcha') as mock_recaptcha:
-            mock_recaptcha.return_value = 0.1  # Below threshold of 0.3
-            
-            response = requests.post(
-                url,
-                json={
-                    "name": "João Silva",
-                    "email": "joao@example.com",
-                    "recaptchaToken": "mock-token"
-                },
-                headers={"Content-Type": "application/json"}
-            )
+        # Create first lead
+        response1 = http.post(url, data=_FACEBOOK_BYTES, headers=JSON_HEADERS)
         
-        assert response.status_code == 400
-        data = response.json()
-        assert data["code"] == "recaptcha_failed"
-        assert "Security verification failed" in data["error"]
-    
-    def test_create_lead_update_existing_lead(self, firebase_emulator, db):
-        """Test updating an existing lead with same email."""
-        url = f"http://localhost:5001/test-project/us-central1/create_lead"
+        assert response1.status_code == 200
+        lead_id_1 = _json(response1)["leadId"]
         
-        with patch('src.brokers.https.create_lead._verify_recaptcha') as mock_recaptcha:
-            mock_recaptcha.return_value = 0.8
-            
-            # Create first lead
-            response1 = requests.post(
-                url,
-                json={
-                    "name": "João Silva",
-                    "email": "joao@example.com",
-                    "recaptchaToken": "mock-token",
-                    "utm_source": "facebook"
-                },
-                headers={"Content-Type": "application/json"}
-            )
-            
-            assert response1.status_code == 200
-            lead_id_1 = response1.json()["leadId"]
-            
-            # Create second lead with same email
-            response2 = requests.post(
-                url,
-                json={
-                    "name": "João Silva Updated",
-                    "email": "joao@example.com",
-                    "recaptchaToken": "mock-token",
-                    "utm_source": "google"
-                },
-                headers={"Content-Type": "application/json"}
-            )
-            
-            assert response2.status_code == 200
-            lead_id_2 = response2.json()["leadId"]
-            
-            # Should update the existing lead, not create new one
-            assert lead_id_1 == lead_id_2
-            
-            # Verify updated data
-            lead_doc = db.collections["leads"].document(lead_id_1).get()
-            lead_data = lead_doc.to_dict()
-            assert lead_data["name"] == "João Silva Updated"
-            assert lead_data["utm"]["lastTouch"]["source"] == "google"
+        # Create second lead with same email
+        response2 = http.post(url, data=_GOOGLE_UPDATED_BYTES, headers=JSON_HEADERS)
+        
+        assert response2.status_code == 200
+        lead_id_2 = _json(response2)["leadId"]
+        
+        # Should update the existing lead, not create new one
+        assert lead_id_1 == lead_id_2
+        
+        # Verify updated data
+        lead_doc = db.collections["leads"].document(lead_id_1).get()
+        lead_data = lead_doc.to_dict()
+        assert lead_data["name"] == "João Silva Updated"
+        assert lead_data["utm"]["lastTouch"]["source"] == "google"
     
-    def test_create_lead_cors_preflight(self, firebase_emulator):
+    def test_create_lead_cors_preflight(self, firebase_emulator, http):
         """Test CORS preflight request handling."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
         
-        response = requests.options(url)
+        response = http.options(url)
         
         assert response.status_code == 204
         assert "Access-Control-Allow-Origin" in response.headers
         assert "Access-Control-Allow-Methods" in response.headers
         assert "POST" in response.headers["Access-Control-Allow-Methods"]
     
-    def test_create_lead_invalid_method(self, firebase_emulator):
+    def test_create_lead_invalid_method(self, firebase_emulator, http):
         """Test invalid HTTP method."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
         
-        response = requests.get(url)
+        response = http.get(url)
         
         assert response.status_code == 405
-        data = response.json()
+        data = _json(response)
         assert data["code"] == "method_not_allowed"
     
-    def test_create_lead_invalid_json(self, firebase_emulator):
+    def test_create_lead_invalid_json(self, firebase_emulator, http):
         """Test invalid JSON payload."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
         
-        response = requests.post(
+        response = http.post(
             url,
             data="invalid json",
             headers={"Content-Type": "application/json"}
         )
         
         assert response.status_code == 400
-        data = response.json()
+        data = _json(response)
         assert data["code"] == "invalid_json"
     
     def test_verify_recaptcha_function(self):
@@ -233,6 +227,7 @@ class TestCreateLeadEndpoint:
             assert call_args[1]["data"]["secret"] == "test-secret-key"
             assert call_args[1]["data"]["response"] == "test-token"
             assert call_args[1]["data"]["remoteip"] == "192.168.1.1"
+            assert call_args[1]["timeout"] == 10, "reCAPTCHA call must not hang without a timeout"
     
     def test_verify_recaptcha_failure(self):
         """Test reCAPTCHA verification failure."""
@@ -287,6 +282,25 @@ class TestCreateLeadEndpoint:
         # For new leads, first and last touch should be the same
         assert utm_data["firstTouch"] == utm_data["lastTouch"]
     
+    def test_extract_utm_data_cached(self):
+        """Test identical UTM payloads reuse the cached field mapping."""
+        from src.brokers.https.create_lead import _extract_utm_data, _utm_cached
+        
+        request_data = {"utm_source": "google", "utm_campaign": "bitcoin-book", "gclid": ""}
+        
+        _utm_cached.cache_clear()
+        utm_data_1 = _extract_utm_data(request_data)
+        utm_data_2 = _extract_utm_data(dict(request_data))
+        
+        assert _utm_cached.cache_info().hits == 1
+        assert utm_data_1["firstTouch"]["source"] == utm_data_2["firstTouch"]["source"] == "google"
+        assert "gclid" not in utm_data_1["firstTouch"]
+        
+        # Results are fresh dicts per call, so one lead can't mutate another's UTM data
+        assert utm_data_1["firstTouch"] is not utm_data_2["firstTouch"]
+        utm_data_1["firstTouch"]["source"] = "changed"
+        assert _extract_utm_data(request_data)["firstTouch"]["source"] == "google"
+    
     def test_get_client_ip(self):
         """Test client IP extraction function."""
         from src.brokers.https.create_lead import _get_client_ip
@@ -307,68 +321,59 @@ class TestCreateLeadEndpoint:
         ip = _get_client_ip(mock_request)
         assert ip == "10.0.0.1"
 
-    def test_honeypot_rejection(self, firebase_emulator):
+    def test_honeypot_rejection(self, firebase_emulator, mock_recaptcha, http):
         """Test that honeypot field triggers silent rejection."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
 
-        with patch('src.brokers.https.create_lead._verify_recaptcha') as mock_recaptcha:
-            mock_recaptcha.return_value = 0.8
-
-            response = requests.post(
-                url,
-                json={
-                    "name": "Bot User",
-                    "email": "bot@example.com",
-                    "recaptchaToken": "mock-token",
-                    "website_url": "http://spam.com"  # Honeypot field filled
-                },
-                headers={"Content-Type": "application/json"}
-            )
+        response = http.post(
+            url,
+            json={
+                "name": "Bot User",
+                "email": "bot@example.com",
+                "recaptchaToken": "mock-token",
+                "website_url": "http://spam.com"  # Honeypot field filled
+            },
+            headers={"Content-Type": "application/json"}
+        )
 
-            assert response.status_code == 200  # Silent success
-            data = response.json()
-            assert data["success"] is True
-            assert data["leadId"] == "bot-rejected"
+        assert response.status_code == 200  # Silent success
+        data = _json(response)
+        assert data["success"] is True
+        assert data["leadId"] == "bot-rejected"
 
-    def test_timing_rejection(self, firebase_emulator):
+    def test_timing_rejection(self, firebase_emulator, mock_recaptcha, http):
         """Test that fast submission triggers silent rejection."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
 
-        with patch('src.brokers.https.create_lead._verify_recaptcha') as mock_recaptcha:
-            mock_recaptcha.return_value = 0.8
-
-            response = requests.post(
-                url,
-                json={
-                    "name": "Fast Bot",
-                    "email": "fastbot@example.com",
-                    "recaptchaToken": "mock-token",
-                    "submission_time": 1.5  # Less than 3 seconds
-                },
-                headers={"Content-Type": "application/json"}
-            )
+        response = http.post(
+            url,
+            json={
+                "name": "Fast Bot",
+                "email": "fastbot@example.com",
+                "recaptchaToken": "mock-token",
+                "submission_time": 1.5  # Less than 3 seconds
+            },
+            headers={"Content-Type": "application/json"}
+        )
 
-            assert response.status_code == 200  # Silent success
-            data = response.json()
-            assert data["success"] is True
-            assert data["leadId"] == "bot-rejected-timing"
+        assert response.status_code == 200  # Silent success
+        data = _json(response)
+        assert data["success"] is True
+        assert data["leadId"] == "bot-rejected-timing"
 
-    def test_rate_limit_ip(self, firebase_emulator):
+    def test_rate_limit_ip(self, firebase_emulator, mock_recaptcha, http, reset_rate_limits):
         """Test IP-based rate limiting."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
 
-        # Reset rate limiter for test
-        from src.util.rate_limiter import rate_limiter
-        rate_limiter.ip_limits.clear()
+        # Start from empty buckets in Firestore so reruns within the refill window pass
+        reset_rate_limits(ips=["192.168.1.100"], emails=[f"user{i}@example.com" for i in range(11)])
 
-        with patch('src.brokers.https.create_lead._verify_recaptcha') as mock_recaptcha, \
-             patch('src.brokers.https.create_lead._get_client_ip') as mock_ip:
-            mock_recaptcha.return_value = 0.8
+        with patch('src.brokers.https.create_lead._get_client_ip') as mock_ip:
             mock_ip.return_value = "192.168.1.100"
 
             # Send 10 requests (should be allowed)
             for i in range(10):
-                response = requests.post(
+                response = http.post(
                     url,
                     json={
                         "name": f"User {i}",
@@ -381,7 +386,7 @@ class TestCreateLeadEndpoint:
                 assert response.status_code == 200, f"Request {i+1} should succeed"
 
             # 11th request should be rate limited
-            response = requests.post(
+            response = http.post(
                 url,
                 json={
                     "name": "User 11",
@@ -393,26 +398,26 @@ class TestCreateLeadEndpoint:
             )
 
             assert response.status_code == 429
-            data = response.json()
+            data = _json(response)
             assert "Too many requests" in data["error"]
             assert "Retry-After" in response.headers
 
-    def test_rate_limit_email(self, firebase_emulator):
+    def test_rate_limit_email(self, firebase_emulator, mock_recaptcha, http, reset_rate_limits):
         """Test email-based rate limiting."""
         url = f"http://localhost:5001/test-project/us-central1/create_lead"
 
-        # Reset rate limiter for test
-        from src.util.rate_limiter import rate_limiter
-        rate_limiter.email_limits.clear()
+        # Start from empty buckets in Firestore so reruns within the refill window pass
+        reset_rate_limits(
+            ips=["192.168.1.0", "192.168.1.1", "192.168.1.2", "192.168.1.200"],
+            emails=["same@example.com"]
+        )
 
-        with patch('src.brokers.https.create_lead._verify_recaptcha') as mock_recaptcha, \
-             patch('src.brokers.https.create_lead._get_client_ip') as mock_ip:
-            mock_recaptcha.return_value = 0.8
+        with patch('src.brokers.https.create_lead._get_client_ip') as mock_ip:
 
             # Send 3 requests with same email (should be allowed)
             for i in range(3):
                 mock_ip.return_value = f"192.168.1.{i}"  # Different IPs
-                response = requests.post(
+                response = http.post(
                     url,
                     json={
                         "name": f"Same User {i}",
@@ -426,7 +431,7 @@ class TestCreateLeadEndpoint:
 
             # 4th request with same email should be rate limited
             mock_ip.return_value = "192.168.1.200"  # Different IP
-            response = requests.post(
+            response = http.post(
                 url,
                 json={
                     "name": "Same User 4",
@@ -438,6 +443,6 @@ class TestCreateLeadEndpoint:
             )
 
             assert response.status_code == 429
-            data = response.json()
+            data = _json(response)
             assert "Too many submissions for this email" in data["error"]
             assert "Retry-After" in response.headers
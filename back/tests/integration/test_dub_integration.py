@@ -5,15 +5,142 @@ from unittest.mock import Mock, patch, MagicMock
 import json
 import hmac
 import hashlib
+from dataclasses import dataclass
 from src.services.dub_service import DubService
 from src.services.webhook_processors.dub_processor import process_dub_webhook
 
+WEBHOOK_SECRET = "test_secret"
+
+# (payload, valid signature) pairs, signed once at import
+SIGNED_PAYLOADS = [
+    (payload, hmac.new(WEBHOOK_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest())
+    for payload in (
+        '{"id":"evt_123","event":"sale.created"}',
+        '{"id":"evt_456","event":"lead.created"}',
+        '{"id":"evt_789","event":"commission.created","data":{"amount":10.0}}',
+        '{"id":"evt_abc","event":"partner.enrolled","data":{"name":"Parceiro Ç"}}',
+        '',
+    )
+]
+
+# Canned dub.co SDK responses, shared by reference (never mutated)
+_LEAD_RESPONSE = {
+    'click': {'id': 'clk_123'},
+    'customer': {
+        'id': 'user_456',
+        'email': 'test@example.com',
+        'name': 'Test User'
+    }
+}
+_SALE_RESPONSE = {
+    'sale': {'id': 'sale_789'},
+    'amount': 9900,
+    'currency': 'BRL',
+    'customer': {'id': 'user_456'}
+}
+
+
+# Webhook events for the handled dub.co event types
+SALE_EVENT = {
+    'id': 'evt_123',
+    'event': 'sale.created',
+    'data': {
+        'customer': {
+            'id': 'user_456',
+            'email': 'test@example.com'
+        },
+        'saleAmount': 99.00,
+        'currency': 'USD',
+        'partner': {
+            'id': 'partner_789',
+            'name': 'Test Partner'
+        }
+    }
+}
+LEAD_EVENT = {
+    'id': 'evt_456',
+    'event': 'lead.created',
+    'data': {
+        'eventName': 'Sign up',
+        'customer': {
+            'id': 'user_789',
+            'email': 'lead@example.com'
+        },
+        'click': {
+            'id': 'clk_abc'
+        },
+        'link': {
+            'shortLink': 'https://dub.sh/test'
+        }
+    }
+}
+COMMISSION_EVENT = {
+    'id': 'evt_789',
+    'event': 'commission.created',
+    'data': {
+        'id': 'comm_123',
+        'amount': 10.00,
+        'currency': 'USD',
+        'status': 'pending',
+        'partner': {
+            'id': 'partner_456',
+            'email': 'partner@example.com'
+        },
+        'sale': {
+            'amount': 100.00
+        }
+    }
+}
+PARTNER_ENROLLED_EVENT = {
+    'id': 'evt_abc',
+    'event': 'partner.enrolled',
+    'data': {
+        'id': 'partner_new',
+        'name': 'New Partner',
+        'email': 'new@partner.com',
+        'status': 'approved',
+        'programId': 'prog_123',
+        'links': [
+            {
+                'shortLink': 'https://dub.sh/partner1'
+            }
+        ]
+    }
+}
+
+
+@dataclass(slots=True)
+class FakeProductDoc:
+    """Product document fields read by StripeService."""
+    id: str
+    name: str
+    description: str
+
+
+@dataclass(slots=True)
+class FakePriceDoc:
+    """ProductPrice document fields read by StripeService."""
+    id: str
+    amount: int
+    currency: str
+
+
+@dataclass(slots=True)
+class FakeDocument:
+    """Stand-in for a Product/ProductPrice wrapper exposing `.doc`."""
+    doc: object
+
 
 @pytest.mark.integration
 class TestDubService:
     """Test DubService API integration."""
 
-    @patch.dict('os.environ', {'DUB_API_KEY': 'test_key', 'DUB_WEBHOOK_SECRET': 'test_secret'})
+    @pytest.fixture(scope="class", autouse=True)
+    def _dub_env(self):
+        """Set dub.co credentials once for the class, restoring os.environ afterwards."""
+        with patch.dict('os.environ', {'DUB_API_KEY': 'test_key', 'DUB_WEBHOOK_SECRET': WEBHOOK_SECRET}):
+            yield
+
     @patch('src.services.dub_service.Dub')
     def test_track_lead(self, mock_dub_class):
         """Test lead tracking functionality."""
@@ -23,14 +150,7 @@ class TestDubService:
 
         # Configure mock response
         mock_response = Mock()
-        mock_response.dict.return_value = {
-            'click': {'id': 'clk_123'},
-            'customer': {
-                'id': 'user_456',
-                'email': 'test@example.com',
-                'name': 'Test User'
-            }
-        }
+        mock_response.dict.return_value = _LEAD_RESPONSE
         mock_dub_instance.track.lead.return_value = mock_response
 
         # Test
@@ -52,7 +172,6 @@ class TestDubService:
         )
         assert result == mock_response.dict.return_value
 
-    @patch.dict('os.environ', {'DUB_API_KEY': 'test_key', 'DUB_WEBHOOK_SECRET': 'test_secret'})
     @patch('src.services.dub_service.Dub')
     def test_track_sale(self, mock_dub_class):
         """Test sale tracking functionality."""
@@ -62,12 +181,7 @@ class TestDubService:
 
         # Configure mock response
         mock_response = Mock()
-        mock_response.dict.return_value = {
-            'sale': {'id': 'sale_789'},
-            'amount': 9900,
-            'currency': 'BRL',
-            'customer': {'id': 'user_456'}
-        }
+        mock_response.dict.return_value = _SALE_RESPONSE
         mock_dub_instance.track.sale.return_value = mock_response
 
         # Test
@@ -90,7 +204,6 @@ class TestDubService:
         )
         assert result == mock_response.dict.return_value
 
-    @patch.dict('os.environ', {'DUB_API_KEY': 'test_key', 'DUB_WEBHOOK_SECRET': 'test_secret'})
     @patch('src.services.dub_service.Dub')
     def test_track_sale_failure_graceful(self, mock_dub_class):
         """Test that sale tracking failures don't break payment flow."""
@@ -111,133 +224,47 @@ class TestDubService:
         assert result['tracked'] is False
         assert 'error' in result
 
-    def test_verify_webhook_signature(self):
+    @pytest.mark.parametrize("payload,valid_sig", SIGNED_PAYLOADS)
+    def test_verify_webhook_signature(self, payload, valid_sig):
         """Test webhook signature verification."""
-        with patch.dict('os.environ', {'DUB_API_KEY': 'test_key', 'DUB_WEBHOOK_SECRET': 'test_secret'}):
-            service = DubService()
-
-            payload = '{"id":"evt_123","event":"sale.created"}'
-            secret = "test_secret"
+        service = DubService()
 
-            # Generate valid signature
-            valid_sig = hmac.new(
-                secret.encode(),
-                payload.encode(),
-                hashlib.sha256
-            ).hexdigest()
+        # Test valid signature
+        assert service.verify_webhook_signature(payload, valid_sig) is True
 
-            # Test valid signature
-            assert service.verify_webhook_signature(payload, valid_sig) is True
+        # Test invalid signature
+        assert service.verify_webhook_signature(payload, "invalid_sig") is False
 
-            # Test invalid signature
-            assert service.verify_webhook_signature(payload, "invalid_sig") is False
+        # Same length but wrong, and well-formed hex of the wrong length
+        wrong_sig = ("0" if valid_sig[0] != "0" else "1") + valid_sig[1:]
+        assert service.verify_webhook_signature(payload, wrong_sig) is False
+        assert service.verify_webhook_signature(payload, valid_sig[:32]) is False
 
 
 @pytest.mark.integration
 class TestDubWebhookProcessor:
     """Test dub.co webhook processing."""
 
-    def test_process_sale_created(self):
-        """Test processing of sale.created webhook."""
-        event = {
-            'id': 'evt_123',
-            'event': 'sale.created',
-            'data': {
-                'customer': {
-                    'id': 'user_456',
-                    'email': 'test@example.com'
-                },
-                'saleAmount': 99.00,
-                'currency': 'USD',
-                'partner': {
-                    'id': 'partner_789',
-                    'name': 'Test Partner'
-                }
-            }
-        }
-
-        result = process_dub_webhook(event)
-
-        assert result['processed'] is True
-        assert result['sale_amount'] == 99.00
-
-    def test_process_lead_created(self):
-        """Test processing of lead.created webhook."""
-        event = {
-            'id': 'evt_456',
-            'event': 'lead.created',
-            'data': {
-                'eventName': 'Sign up',
-                'customer': {
-                    'id': 'user_789',
-                    'email': 'lead@example.com'
-                },
-                'click': {
-                    'id': 'clk_abc'
-                },
-                'link': {
-                    'shortLink': 'https://dub.sh/test'
-                }
-            }
-        }
-
-        result = process_dub_webhook(event)
-
-        assert result['processed'] is True
-        assert result['customer_id'] == 'user_789'
-
-    def test_process_commission_created(self):
-        """Test processing of commission.created webhook."""
-        event = {
-            'id': 'evt_789',
-            'event': 'commission.created',
-            'data': {
-                'id': 'comm_123',
-                'amount': 10.00,
-                'currency': 'USD',
-                'status': 'pending',
-                'partner': {
-                    'id': 'partner_456',
-                    'email': 'partner@example.com'
-                },
-                'sale': {
-                    'amount': 100.00
-                }
-            }
-        }
-
-        result = process_dub_webhook(event)
-
-        assert result['processed'] is True
-        assert result['commission_id'] == 'comm_123'
-        assert result['partner_id'] == 'partner_456'
-        assert result['amount'] == 10.00
-
-    def test_process_partner_enrolled(self):
-        """Test processing of partner.enrolled webhook."""
-        event = {
-            'id': 'evt_abc',
-            'event': 'partner.enrolled',
-            'data': {
-                'id': 'partner_new',
-                'name': 'New Partner',
-                'email': 'new@partner.com',
-                'status': 'approved',
-                'programId': 'prog_123',
-                'links': [
-                    {
-                        'shortLink': 'https://dub.sh/partner1'
-                    }
-                ]
-            }
-        }
-
+    @pytest.mark.parametrize("event,expected", [
+        pytest.param(SALE_EVENT, {'processed': True, 'sale_amount': 99.00}, id="sale.created"),
+        pytest.param(LEAD_EVENT, {'processed': True, 'customer_id': 'user_789'}, id="lead.created"),
+        pytest.param(
+            COMMISSION_EVENT,
+            {'processed': True, 'commission_id': 'comm_123', 'partner_id': 'partner_456', 'amount': 10.00},
+            id="commission.created"
+        ),
+        pytest.param(
+            PARTNER_ENROLLED_EVENT,
+            {'processed': True, 'partner_id': 'partner_new', 'partner_email': 'new@partner.com', 'links_count': 1},
+            id="partner.enrolled"
+        ),
+    ])
+    def test_process_event(self, event, expected):
+        """Test processing of each handled webhook event type."""
         result = process_dub_webhook(event)
 
-        assert result['processed'] is True
-        assert result['partner_id'] == 'partner_new'
-        assert result['partner_email'] == 'new@partner.com'
-        assert result['links_count'] == 1
+        for key, value in expected.items():
+            assert result[key] == value, key
 
     def test_process_unhandled_event(self):
         """Test handling of unknown event types."""
@@ -262,8 +289,6 @@ class TestDubIntegrationWithStripe:
     def test_checkout_session_includes_dub_customer_id(self, mock_subscription_class, mock_stripe):
         """Test that Stripe checkout includes dubCustomerId in metadata."""
         from src.services.stripe_service import StripeService
-        from src.documents.products.Product import Product
-        from src.documents.products.ProductPrice import ProductPrice
 
         # Setup mocks
         mock_subscription = Mock()
@@ -276,18 +301,9 @@ class TestDubIntegrationWithStripe:
         mock_session.id = 'cs_test_123'
         mock_stripe.checkout.Session.create.return_value = mock_session
 
-        # Create mock product and price
-        mock_product = Mock(spec=Product)
-        mock_product.doc = Mock()
-        mock_product.doc.id = 'prod_123'
-        mock_product.doc.name = 'Test Product'
-        mock_product.doc.description = 'Test Description'
-
-        mock_price = Mock(spec=ProductPrice)
-        mock_price.doc = Mock()
-        mock_price.doc.id = 'price_123'
-        mock_price.doc.amount = 9900
-        mock_price.doc.currency = 'BRL'
+        # Create fake product and price (no call recording needed)
+        mock_product = FakeDocument(doc=FakeProductDoc('prod_123', 'Test Product', 'Test Description'))
+        mock_price = FakeDocument(doc=FakePriceDoc('price_123', 9900, 'BRL'))
 
         # Test
         with patch.dict('os.environ', {
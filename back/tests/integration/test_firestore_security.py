@@ -1,81 +1,157 @@
 """Integration tests for Firestore security rules."""
 
+import functools
+import os
+import pathlib
+import re
+import socket
+import orjson
 import pytest
 import firebase_admin
 from firebase_admin import auth, firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
+from collections import Counter
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
+# Firebase config lives at the repository root, next to back/
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[3]
+RULES_PATH = PROJECT_ROOT / "firestore.rules"
+INDEXES_PATH = PROJECT_ROOT / "firestore.indexes.json"
+FIREBASE_CONFIG_PATH = PROJECT_ROOT / "firebase.json"
+
+
+@functools.lru_cache(maxsize=1)
+def _firestore_emulator_reachable(timeout: float = 2.0) -> bool:
+    """Check once per session that FIRESTORE_EMULATOR_HOST accepts connections."""
+    host_port = os.getenv("FIRESTORE_EMULATOR_HOST")
+    if not host_port:
+        return False
+    host, _, port = host_port.rpartition(":")
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout):
+            return True
+    except (OSError, ValueError):
+        return False
+
+
+@dataclass(frozen=True)
+class RulesModel:
+    """firestore.rules parsed into statements and helper function bodies.
+
+    Attributes:
+        raw: Original file contents
+        stmts: Every `;`-terminated statement, whitespace-collapsed and without the `;`
+        functions: Function name -> whitespace-collapsed body
+    """
+    raw: str
+    stmts: frozenset
+    functions: dict
+
+    @classmethod
+    def parse(cls, raw: str) -> "RulesModel":
+        """Parse rules source into a model."""
+        code = re.sub(r"//[^\n]*", "", raw)
+        # Statements start after the last brace preceding them
+        stmts = frozenset(
+            " ".join(re.split(r"[{}]", chunk)[-1].split())
+            for chunk in code.split(";")
+        )
+        functions = {
+            name: " ".join(body.split())
+            for name, body in re.findall(r"function\s+(\w+)\([^)]*\)\s*\{([^{}]*)\}", code)
+        }
+        return cls(raw=raw, stmts=stmts, functions=functions)
+
+
+@pytest.fixture(scope="session")
+def rules_model():
+    """Get firestore.rules parsed once per session."""
+    return RulesModel.parse(RULES_PATH.read_text())
+
+
+@pytest.fixture(scope="session")
+def indexes_json():
+    """Get the parsed firestore.indexes.json, read once per session."""
+    return orjson.loads(INDEXES_PATH.read_bytes())
+
+
+@pytest.fixture(scope="session")
+def firebase_json():
+    """Get the parsed firebase.json, read once per session."""
+    return orjson.loads(FIREBASE_CONFIG_PATH.read_bytes())
+
 
 @pytest.mark.integration
 class TestFirestoreSecurityRules:
     """Test Firestore security rules enforcement."""
     
-    def setup_method(self):
-        """Set up test data before each test."""
-        self.db = firestore.client()
+    @classmethod
+    def setup_class(cls):
+        """Set up users and test data once for the whole class.
+
+        Tests that write extra documents clean those up themselves. Skips the
+        whole class when the Firestore emulator is not reachable, instead of
+        letting every test wait out its first RPC.
+        """
+        if not _firestore_emulator_reachable():
+            pytest.skip("Firestore emulator not reachable at FIRESTORE_EMULATOR_HOST")
         
-        # Test emails
-        self.admin_email = "admin@example.com"
-        self.user_email = "user@example.com"
+        cls.db = firestore.client()
         
-        # Create test users
-        try:
-            self.admin_user = auth.create_user(
-                email=self.admin_email,
-                password="testpass123",
-                uid="test-admin"
-            )
-        except auth.UserNotFoundError:
-            pass
-        except Exception:
-            # User might already exist
-            self.admin_user = auth.get_user_by_email(self.admin_email)
+        # Test emails
+        cls.admin_email = "admin@example.com"
+        cls.user_email = "user@example.com"
         
-        try:
-            self.regular_user = auth.create_user(
-                email=self.user_email,
-                password="testpass123",
-                uid="test-user"
-            )
-        except auth.UserNotFoundError:
-            pass
-        except Exception:
-            # User might already exist
-            self.regular_user = auth.get_user_by_email(self.user_email)
+        # Create test users, reusing them if a previous run left them behind
+        cls.admin_user = cls._get_or_create_user(cls.admin_email, "test-admin")
+        cls.regular_user = cls._get_or_create_user(cls.user_email, "test-user")
         
         # Setup admin whitelist in settings
-        self._setup_admin_settings()
+        cls._setup_admin_settings()
         
         # Create test data
-        self._create_test_data()
+        cls._create_test_data()
     
-    def teardown_method(self):
-        """Clean up test data after each test."""
+    @classmethod
+    def teardown_class(cls):
+        """Clean up test data after the last test in the class."""
         try:
-            # Clean up test users
-            auth.delete_user(self.admin_user.uid)
-            auth.delete_user(self.regular_user.uid)
+            # Clean up test users in one Auth request
+            auth.delete_users([cls.admin_user.uid, cls.regular_user.uid])
         except Exception:
             pass
         
-        # Clean up test documents
+        # Clean up test documents in one commit
         try:
-            self.db.collection("leads").document("test-lead").delete()
-            self.db.collection("settings").document("admins").delete()
-            self.db.collection("settings").document("test-config").delete()
-            self.db.collection("pages").document("test-privacy").delete()
+            settings_ref = cls.db.collection("settings")
+            batch = cls.db.batch()
+            batch.delete(cls.db.collection("leads").document("test-lead"))
+            batch.delete(settings_ref.document("admins"))
+            batch.delete(settings_ref.document("test-config"))
+            batch.delete(cls.db.collection("pages").document("test-privacy"))
+            batch.commit()
         except Exception:
             pass
     
-    def _setup_admin_settings(self):
+    @staticmethod
+    def _get_or_create_user(email: str, uid: str):
+        """Get the Auth user for an email, creating it if it does not exist."""
+        try:
+            return auth.get_user_by_email(email)
+        except auth.UserNotFoundError:
+            return auth.create_user(email=email, password="testpass123", uid=uid)
+    
+    @classmethod
+    def _setup_admin_settings(cls):
         """Set up admin email whitelist in settings."""
         admin_settings = {
-            "emails": [self.admin_email]
+            "emails": [cls.admin_email]
         }
-        self.db.collection("settings").document("admins").set(admin_settings)
+        cls.db.collection("settings").document("admins").set(admin_settings)
     
-    def _create_test_data(self):
+    @classmethod
+    def _create_test_data(cls):
         """Create test documents for security testing."""
         # Test lead
         lead_data = {
@@ -84,7 +160,7 @@ class TestFirestoreSecurityRules:
             "createdAt": datetime.now(timezone.utc),
             "download": {"count24h": 0}
         }
-        self.db.collection("leads").document("test-lead").set(lead_data)
+        cls.db.collection("leads").document("test-lead").set(lead_data)
         
         # Test settings
         settings_data = {
@@ -93,29 +169,16 @@ class TestFirestoreSecurityRules:
                 "subheadline": "Test Subheadline"
             }
         }
-        self.db.collection("settings").document("test-config").set(settings_data)
+        cls.db.collection("settings").document("test-config").set(settings_data)
         
         # Test privacy page (enabled)
         privacy_data = {
             "enabled": True,
             "content": "Test privacy policy content"
         }
-        self.db.collection("pages").document("test-privacy").set(privacy_data)
+        cls.db.collection("pages").document("test-privacy").set(privacy_data)
     
-    def _get_authenticated_client(self, user_uid: str, custom_claims: dict = None):
-        """Get authenticated Firestore client for testing."""
-        # Set custom claims if provided
-        if custom_claims:
-            auth.set_custom_user_claims(user_uid, custom_claims)
-        
-        # Create custom token
-        custom_token = auth.create_custom_token(user_uid)
-        
-        # Note: In real tests, you would use this token with the client SDK
-        # For emulator testing, we'll simulate the authentication context
-        return self.db
-    
-    def test_leads_collection_security(self):
+    def test_leads_collection_security(self, rules_model):
         """Test security rules for leads collection."""
         # Admin should be able to read leads (tested via admin SDK)
         leads_ref = self.db.collection("leads")
@@ -123,7 +186,7 @@ class TestFirestoreSecurityRules:
         assert len(leads) >= 0  # Admin SDK can always read
         
         # Verify lead document exists
-        lead_doc = self.db.collection("leads").document("test-lead").get()
+        lead_doc = leads_ref.document("test-lead").get()
         assert lead_doc.exists
         
         # Test that direct client writes are blocked (simulated)
@@ -131,12 +194,10 @@ class TestFirestoreSecurityRules:
         # Here we verify the rules are structured correctly
         
         # Verify the rule denies client create/update/delete
-        with open("/Users/toniolucas/vork/r38/firestore.rules", "r") as f:
-            rules_content = f.read()
-            assert "allow create, update, delete: if false;" in rules_content
-            assert "allow read: if isAdmin();" in rules_content
+        assert "allow create, update, delete: if false" in rules_model.stmts
+        assert "allow read: if isAdmin()" in rules_model.stmts
     
-    def test_settings_collection_security(self):
+    def test_settings_collection_security(self, rules_model):
         """Test security rules for settings collection."""
         # Public should be able to read settings (rules allow read: if true)
         settings_ref = self.db.collection("settings").document("test-config")
@@ -152,16 +213,15 @@ class TestFirestoreSecurityRules:
         assert updated_doc.to_dict()["hero"]["headline"] == "Updated Headline"
         
         # Verify rules structure for settings
-        with open("/Users/toniolucas/vork/r38/firestore.rules", "r") as f:
-            rules_content = f.read()
-            assert "match /settings/{docId}" in rules_content
-            assert "allow read: if true;" in rules_content
-            assert "allow write: if isAdmin();" in rules_content
+        assert "match /settings/{docId}" in rules_model.raw
+        assert "allow read: if true" in rules_model.stmts
+        assert "allow write: if isAdmin()" in rules_model.stmts
     
-    def test_pages_collection_security(self):
+    def test_pages_collection_security(self, rules_model):
         """Test security rules for pages collection."""
         # Privacy page should be readable when enabled
-        privacy_ref = self.db.collection("pages").document("test-privacy")
+        pages_ref = self.db.collection("pages")
+        privacy_ref = pages_ref.document("test-privacy")
         privacy_doc = privacy_ref.get()
         assert privacy_doc.exists
         assert privacy_doc.to_dict()["enabled"] is True
@@ -171,93 +231,62 @@ class TestFirestoreSecurityRules:
             "enabled": False,
             "content": "Disabled content"
         }
-        self.db.collection("pages").document("test-privacy-disabled").set(disabled_privacy_data)
+        disabled_privacy_ref = pages_ref.document("test-privacy-disabled")
+        disabled_privacy_ref.set(disabled_privacy_data)
         
         # Admin should be able to read/write all pages (tested via admin SDK)
         admin_page_data = {
             "enabled": True,
             "content": "Admin created content"
         }
-        self.db.collection("pages").document("admin-page").set(admin_page_data)
+        admin_page_ref = pages_ref.document("admin-page")
+        admin_page_ref.set(admin_page_data)
         
         # Verify rules structure for pages
-        with open("/Users/toniolucas/vork/r38/firestore.rules", "r") as f:
-            rules_content = f.read()
-            assert "match /pages/{docId}" in rules_content
-            assert 'allow read: if (docId == "privacy" && resource.data.enabled == true) || isAdmin();' in rules_content
-            assert "allow write: if isAdmin();" in rules_content
+        assert "match /pages/{docId}" in rules_model.raw
+        assert 'allow read: if (docId == "privacy" && resource.data.enabled == true) || isAdmin()' in rules_model.stmts
+        assert "allow write: if isAdmin()" in rules_model.stmts
         
         # Clean up test documents
-        self.db.collection("pages").document("test-privacy-disabled").delete()
-        self.db.collection("pages").document("admin-page").delete()
+        disabled_privacy_ref.delete()
+        admin_page_ref.delete()
     
-    def test_admin_authentication_functions(self):
+    def test_admin_authentication_functions(self, rules_model):
         """Test admin authentication helper functions in rules."""
-        with open("/Users/toniolucas/vork/r38/firestore.rules", "r") as f:
-            rules_content = f.read()
-            
-            # Verify isAuthenticated function
-            assert "function isAuthenticated()" in rules_content
-            assert "return request.auth != null;" in rules_content
-            
-            # Verify isAdmin function with both custom claim and email whitelist
-            assert "function isAdmin()" in rules_content
-            assert "request.auth.token.admin == true" in rules_content
-            assert "(request.auth.token.email in get(/databases/$(database)/documents/settings/admins).data.emails)" in rules_content
+        # Verify isAuthenticated function
+        assert rules_model.functions["isAuthenticated"] == "return request.auth != null;"
+        
+        # Verify isAdmin function with both custom claim and email whitelist
+        is_admin = rules_model.functions["isAdmin"]
+        assert "request.auth.token.admin == true" in is_admin
+        assert "(request.auth.token.email in get(/databases/$(database)/documents/settings/admins).data.emails)" in is_admin
     
-    def test_default_deny_rule(self):
+    def test_default_deny_rule(self, rules_model):
         """Test that default deny rule exists for unmatched paths."""
-        with open("/Users/toniolucas/vork/r38/firestore.rules", "r") as f:
-            rules_content = f.read()
-            
-            # Verify default deny rule
-            assert "match /{document=**}" in rules_content
-            assert "allow read, write: if false;" in rules_content
+        # Verify default deny rule
+        assert "match /{document=**}" in rules_model.raw
+        assert "allow read, write: if false" in rules_model.stmts
     
-    def test_firestore_indexes_configuration(self):
+    def test_firestore_indexes_configuration(self, indexes_json):
         """Test that required indexes are configured."""
-        with open("/Users/toniolucas/vork/r38/firestore.indexes.json", "r") as f:
-            import json
-            indexes_config = json.load(f)
-            
-            indexes = indexes_config["indexes"]
-            
-            # Check for createdAt desc index
-            created_at_index = None
-            for index in indexes:
-                if (index["collectionGroup"] == "leads" and 
-                    len(index["fields"]) == 1 and
-                    index["fields"][0]["fieldPath"] == "createdAt" and
-                    index["fields"][0]["order"] == "DESCENDING"):
-                    created_at_index = index
-                    break
-            
-            assert created_at_index is not None, "createdAt desc index not found"
-            
-            # Check for email asc, createdAt desc composite index  
-            composite_index = None
-            for index in indexes:
-                if (index["collectionGroup"] == "leads" and 
-                    len(index["fields"]) == 2 and
-                    index["fields"][0]["fieldPath"] == "email" and
-                    index["fields"][0]["order"] == "ASCENDING" and
-                    index["fields"][1]["fieldPath"] == "createdAt" and
-                    index["fields"][1]["order"] == "DESCENDING"):
-                    composite_index = index
-                    break
-            
-            assert composite_index is not None, "email asc, createdAt desc composite index not found"
+        # Canonical (collection, ((field, order), ...)) signature per index
+        index_signatures = {
+            (index["collectionGroup"],
+             tuple((f["fieldPath"], f.get("order", f.get("arrayConfig"))) for f in index["fields"]))
+            for index in indexes_json["indexes"]
+        }
+        
+        assert ("leads", (("createdAt", "DESCENDING"),)) in index_signatures, \
+            "createdAt desc index not found"
+        assert ("leads", (("email", "ASCENDING"), ("createdAt", "DESCENDING"))) in index_signatures, \
+            "email asc, createdAt desc composite index not found"
     
-    def test_firebase_json_configuration(self):
+    def test_firebase_json_configuration(self, firebase_json):
         """Test that Firebase configuration includes indexes."""
-        with open("/Users/toniolucas/vork/r38/firebase.json", "r") as f:
-            import json
-            firebase_config = json.load(f)
-            
-            # Verify Firestore configuration
-            assert "firestore" in firebase_config
-            assert firebase_config["firestore"]["rules"] == "firestore.rules"
-            assert firebase_config["firestore"]["indexes"] == "firestore.indexes.json"
+        # Verify Firestore configuration
+        assert "firestore" in firebase_json
+        assert firebase_json["firestore"]["rules"] == "firestore.rules"
+        assert firebase_json["firestore"]["indexes"] == "firestore.indexes.json"
     
     def test_leads_query_performance(self, db):
         """Test that lead queries can use the configured indexes."""
@@ -278,42 +307,42 @@ class TestFirestoreSecurityRules:
         # Should execute without errors (composite index exists)
         assert len(email_leads_list) >= 0
     
-    def test_security_rules_compilation(self):
+    def test_security_rules_compilation(self, rules_model):
         """Test that security rules compile without errors."""
-        # Read the rules file and check for basic syntax
-        with open("/Users/toniolucas/vork/r38/firestore.rules", "r") as f:
-            rules_content = f.read()
-            
-            # Basic syntax checks
-            assert "rules_version = '2';" in rules_content
-            assert "service cloud.firestore {" in rules_content
-            assert "match /databases/{database}/documents {" in rules_content
-            
-            # Check that all braces are balanced
-            open_braces = rules_content.count("{")
-            close_braces = rules_content.count("}")
-            assert open_braces == close_braces, "Unbalanced braces in rules file"
-            
-            # Check for required function definitions
-            assert "function isAuthenticated()" in rules_content
-            assert "function isAdmin()" in rules_content
+        # Basic syntax checks
+        assert "rules_version = '2'" in rules_model.stmts
+        assert "service cloud.firestore {" in rules_model.raw
+        assert "match /databases/{database}/documents {" in rules_model.raw
+        
+        # Check that all braces are balanced (Counter tallies every char in one C-level pass)
+        braces = Counter(rules_model.raw)
+        assert braces["{"] == braces["}"], "Unbalanced braces in rules file"
+        
+        # Check for required function definitions
+        assert "isAuthenticated" in rules_model.functions
+        assert "isAdmin" in rules_model.functions
     
     def test_admin_email_whitelist_functionality(self):
         """Test admin email whitelist in settings."""
         # Verify admin settings document exists with correct structure
-        admin_doc = self.db.collection("settings").document("admins").get()
+        admins_ref = self.db.collection("settings").document("admins")
+        admin_doc = admins_ref.get()
         assert admin_doc.exists
         
         admin_data = admin_doc.to_dict()
         assert "emails" in admin_data
         assert isinstance(admin_data["emails"], list)
-        assert self.admin_email in admin_data["emails"]
+        emails = set(admin_data["emails"])
+        assert len(emails) == len(admin_data["emails"]), "Duplicate admin emails"
+        assert self.admin_email in emails
         
         # Test adding/removing admin emails
         admin_data["emails"].append("newadmin@example.com")
-        self.db.collection("settings").document("admins").update(admin_data)
+        admins_ref.update(admin_data)
         
         # Verify update
-        updated_doc = self.db.collection("settings").document("admins").get()
+        updated_doc = admins_ref.get()
         updated_data = updated_doc.to_dict()
-        assert "newadmin@example.com" in updated_data["emails"]
+        updated_emails = set(updated_data["emails"])
+        assert len(updated_emails) == len(updated_data["emails"]), "Duplicate admin emails"
+        assert "newadmin@example.com" in updated_emails
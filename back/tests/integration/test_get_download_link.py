@@ -1,34 +1,89 @@
 """Integration tests for get_download_link HTTPS endpoint."""
 
+import asyncio
+import httpx
 import pytest
-import requests
-import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from datetime import datetime, timedelta, timezone
 
+# (id, method, body, expected status, expected code) for errors that touch no shared state
+STATELESS_ERROR_CASES = [
+    ("missing_email", "POST", {}, 400, "missing_email"),
+    ("lead_not_found", "POST", {"email": "nonexistent@example.com"}, 404, "lead_not_found"),
+    ("invalid_json", "POST", "invalid json", 400, "invalid_json"),
+    ("invalid_method", "GET", None, 405, "method_not_allowed"),
+]
+
+# Lead fields that don't vary between tests
+_LEAD_TEMPLATE = {
+    "name": "Test User",
+    "phone": "+55 11 99999-9999",
+    "ip": "192.168.1.1",
+    "userAgent": "Test Agent",
+    "utm": {"firstTouch": {}, "lastTouch": {}},
+    "consent": {"lgpdConsent": True, "consentTextVersion": "v1.0"},
+    "recaptchaScore": 0.8,
+}
+
 
 @pytest.mark.integration
+# All tests share settings/config in the single emulator project, so keep them on one xdist worker
+@pytest.mark.xdist_group(name="download_link_emulator")
 class TestGetDownloadLinkEndpoint:
     """Test the get_download_link HTTPS endpoint with download limits."""
     
-    def setup_method(self):
-        """Set up test data before each test."""
-        self.url = "http://localhost:5001/test-project/us-central1/get_download_link"
-        self.test_email = "test-download@example.com"
-        self.ebook_path = "ebooks/bitcoin-red-pill-3rd-edition.pdf"
+    url = "http://localhost:5001/test-project/us-central1/get_download_link"
+    test_email = "test-download@example.com"
+    ebook_path = "ebooks/bitcoin-red-pill-3rd-edition.pdf"
+    
+    @pytest.fixture(scope="class", autouse=True)
+    def default_settings(self, firebase_app):
+        """Seed the default e-book settings once for the class.
+
+        Tests that need different settings change them in place and set
+        `settings_changed`, so `_reset_test_data` restores them.
+        """
+        from src.apis.Db import Db
+        db = Db.get_instance()
+        self._create_test_settings(db, self.ebook_path)
+        yield
+        db.collections["settings"].document("config").delete()
+    
+    @pytest.fixture(scope="class", autouse=True)
+    def seeded_lead(self, firebase_app):
+        """Seed the test lead once for the class, yielding its reference and initial snapshot."""
+        from src.apis.Db import Db
+        db = Db.get_instance()
+        lead_ref = db.collections["leads"].document(self._create_test_lead(db, self.test_email))
+        yield lead_ref, lead_ref.get().to_dict()
+        lead_ref.delete()
+    
+    @pytest.fixture(autouse=True)
+    def _reset_test_data(self, db, seeded_lead):
+        """Restore the lead snapshot, and changed settings, with one batched commit after each test."""
+        self.lead_ref, snapshot = seeded_lead
+        self.settings_changed = False
+        yield
+        batch = db.firestore.batch()
+        batch.set(self.lead_ref, snapshot)
+        if self.settings_changed:
+            self._create_test_settings(db, self.ebook_path, batch=batch)
+        batch.commit()
+    
+    @pytest.fixture(autouse=True)
+    def mock_signed_url(self):
+        """Patch signed URL generation for each test; tests override `self.mock_url` as needed."""
+        with patch('src.brokers.https.get_download_link._generate_signed_url') as mock_url:
+            mock_url.return_value = "https://storage.googleapis.com/signed-url-mock"
+            self.mock_url = mock_url
+            yield mock_url
     
     def _create_test_lead(self, db, email: str, download_count: int = 0, last_download=None):
         """Create a test lead for download testing."""
         lead_data = {
-            "name": "Test User",
+            **_LEAD_TEMPLATE,
             "email": email,
-            "phone": "+55 11 99999-9999",
             "createdAt": db.server_timestamp,
-            "ip": "192.168.1.1",
-            "userAgent": "Test Agent",
-            "utm": {"firstTouch": {}, "lastTouch": {}},
-            "consent": {"lgpdConsent": True, "consentTextVersion": "v1.0"},
-            "recaptchaScore": 0.8,
             "download": {
                 "firstDownloadedAt": last_download if download_count > 0 else None,
                 "lastDownloadedAt": last_download,
@@ -40,8 +95,18 @@ class TestGetDownloadLinkEndpoint:
         lead_doc_ref.set(lead_data)
         return lead_doc_ref.id
     
-    def _create_test_settings(self, db, ebook_path: str):
-        """Create test settings with e-book configuration."""
+    def _set_download_state(self, download_count: int, last_download):
+        """Overwrite the seeded lead's download counters; `_reset_test_data` restores them."""
+        self.lead_ref.update({
+            "download": {
+                "firstDownloadedAt": last_download,
+                "lastDownloadedAt": last_download,
+                "count24h": download_count
+            }
+        })
+    
+    def _create_test_settings(self, db, ebook_path: str, batch=None):
+        """Create test settings with e-book configuration, queued on `batch` if given."""
         settings_data = {
             "hero": {
                 "headline": "Test Headline",
@@ -55,296 +120,104 @@ class TestGetDownloadLinkEndpoint:
             }
         }
         
-        db.collections["settings"].document("config").set(settings_data)
-    
-    def test_first_download_success(self, firebase_emulator, db):
-        """Test successful first download sets firstDownloadedAt."""
-        # Setup test data
-        lead_id = self._create_test_lead(db, self.test_email)
-        self._create_test_settings(db, self.ebook_path)
-        
-        # Mock signed URL generation
-        with patch('src.brokers.https.get_download_link._generate_signed_url') as mock_url:
-            mock_url.return_value = "https://storage.googleapis.com/signed-url-mock"
-            
-            response = requests.post(
-                self.url,
-                json={"email": self.test_email},
-                headers={"Content-Type": "application/json"}
-            )
+        settings_ref = db.collections["settings"].document("config")
+        if batch is not None:
+            batch.set(settings_ref, settings_data)
+        else:
+            settings_ref.set(settings_data)
+    
+    @pytest.mark.parametrize("download_count,hours_ago,expected_remaining", [
+        pytest.param(0, None, 2, id="first_download"),
+        # 2 previous downloads 2 hours ago: this is the 3rd
+        pytest.param(2, 2, 0, id="within_limit"),
+        # 3 downloads 25 hours ago: the count resets, then increments
+        pytest.param(3, 25, 2, id="reset_after_24h"),
+    ])
+    def test_successful_download(self, firebase_emulator, db, http, download_count, hours_ago, expected_remaining):
+        """Test a lead under the 3/24h limit gets a signed URL and the remaining count."""
+        if download_count:
+            self._set_download_state(download_count, datetime.now(timezone.utc) - timedelta(hours=hours_ago))
+        
+        response = http.post(self.url, json={"email": self.test_email})
         
         assert response.status_code == 200
         data = response.json()
         assert data["ok"] is True
-        assert "downloadUrl" in data
         assert data["downloadUrl"] == "https://storage.googleapis.com/signed-url-mock"
         assert data["expiresIn"] == 600  # 10 minutes in seconds
-        assert data["remainingDownloads"] == 2  # 3 - 1 = 2
-        
-        # Verify database updates
-        lead_doc = db.collections["leads"].document(lead_id).get()
-        lead_data = lead_doc.to_dict()
-        assert lead_data["download"]["count24h"] == 1
-        assert lead_data["download"]["firstDownloadedAt"] is not None
-        assert lead_data["download"]["lastDownloadedAt"] is not None
+        assert data["remainingDownloads"] == expected_remaining
     
-    def test_multiple_downloads_within_limit(self, firebase_emulator, db):
-        """Test multiple downloads within 3/24h limit."""
-        # Setup test data - lead with 2 previous downloads
-        now = datetime.now(timezone.utc)
-        last_download = now - timedelta(hours=2)  # 2 hours ago
-        
-        lead_id = self._create_test_lead(
-            db, 
-            self.test_email, 
-            download_count=2, 
-            last_download=last_download
-        )
-        self._create_test_settings(db, self.ebook_path)
-        
-        # Mock signed URL generation
-        with patch('src.brokers.https.get_download_link._generate_signed_url') as mock_url:
-            mock_url.return_value = "https://storage.googleapis.com/signed-url-mock"
-            
-            response = requests.post(
-                self.url,
-                json={"email": self.test_email},
-                headers={"Content-Type": "application/json"}
-            )
-        
+    def test_counter_state_persisted(self, firebase_emulator, db, http):
+        """Test a download persists the counter and timestamps on the lead."""
+        response = http.post(self.url, json={"email": self.test_email})
         assert response.status_code == 200
-        data = response.json()
-        assert data["ok"] is True
-        assert data["remainingDownloads"] == 0  # This is the 3rd download
         
-        # Verify database updates
-        lead_doc = db.collections["leads"].document(lead_id).get()
-        lead_data = lead_doc.to_dict()
-        assert lead_data["download"]["count24h"] == 3
+        download = self.lead_ref.get().to_dict()["download"]
+        assert download["count24h"] == 1
+        assert download["firstDownloadedAt"] is not None
+        assert download["lastDownloadedAt"] is not None
     
-    def test_download_limit_exceeded(self, firebase_emulator, db):
+    def test_download_limit_exceeded(self, firebase_emulator, db, http):
         """Test download limit exceeded returns 429."""
         # Setup test data - lead with 3 previous downloads within 24h
         now = datetime.now(timezone.utc)
         last_download = now - timedelta(hours=1)  # 1 hour ago
         
-        self._create_test_lead(
-            db, 
-            self.test_email, 
-            download_count=3, 
-            last_download=last_download
-        )
-        self._create_test_settings(db, self.ebook_path)
+        self._set_download_state(3, last_download)
         
-        response = requests.post(
-            self.url,
-            json={"email": self.test_email},
-            headers={"Content-Type": "application/json"}
-        )
+        response = http.post(self.url, json={"email": self.test_email})
         
         assert response.status_code == 429
         data = response.json()
         assert data["code"] == "download_limit_exceeded"
-        assert "Download limit reached" in data["error"]
-        assert "Try again in" in data["error"]
-    
-    def test_download_limit_reset_after_24h(self, firebase_emulator, db):
-        """Test download limit resets after 24 hours."""
-        # Setup test data - lead with 3 downloads from 25 hours ago
-        now = datetime.now(timezone.utc)
-        old_download = now - timedelta(hours=25)  # 25 hours ago
-        
-        lead_id = self._create_test_lead(
-            db, 
-            self.test_email, 
-            download_count=3, 
-            last_download=old_download
-        )
-        self._create_test_settings(db, self.ebook_path)
-        
-        # Mock signed URL generation
-        with patch('src.brokers.https.get_download_link._generate_signed_url') as mock_url:
-            mock_url.return_value = "https://storage.googleapis.com/signed-url-mock"
-            
-            response = requests.post(
-                self.url,
-                json={"email": self.test_email},
-                headers={"Content-Type": "application/json"}
+        # Last download was 1 hour ago, so about 23 hours remain
+        assert 22 * 3600 < data["retryAfterSeconds"] <= 23 * 3600
+    
+    async def test_stateless_error_paths(self, firebase_emulator, http_timeout):
+        """Test each request error that needs no seeded data, sending all requests concurrently."""
+        async with httpx.AsyncClient(timeout=httpx.Timeout(http_timeout[1], connect=http_timeout[0])) as client:
+            responses = await asyncio.gather(*(
+                self._send(client, method, body) for _, method, body, _, _ in STATELESS_ERROR_CASES
+            ))
+        
+        for (case, _, _, expected_status, expected_code), response in zip(STATELESS_ERROR_CASES, responses):
+            assert response.status_code == expected_status, case
+            assert response.json()["code"] == expected_code, case
+    
+    async def _send(self, client, method: str, body):
+        """Send one request, passing string bodies through as raw JSON text."""
+        if isinstance(body, str):
+            return await client.request(
+                method, self.url, content=body, headers={"Content-Type": "application/json"}
             )
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert data["ok"] is True
-        assert data["remainingDownloads"] == 2  # Reset to 1st download
-        
-        # Verify count was reset
-        lead_doc = db.collections["leads"].document(lead_id).get()
-        lead_data = lead_doc.to_dict()
-        assert lead_data["download"]["count24h"] == 1  # Reset and incremented
+        return await client.request(method, self.url, json=body)
     
-    def test_lead_not_found(self, firebase_emulator, db):
-        """Test error when lead email is not found."""
-        self._create_test_settings(db, self.ebook_path)
-        
-        response = requests.post(
-            self.url,
-            json={"email": "nonexistent@example.com"},
-            headers={"Content-Type": "application/json"}
-        )
+    def test_ebook_not_configured(self, firebase_emulator, db, http):
+        """Test a lead without e-book settings gets a storage configuration error."""
+        db.collections["settings"].document("config").delete()
+        self.settings_changed = True
         
-        assert response.status_code == 404
-        data = response.json()
-        assert data["code"] == "lead_not_found"
-    
-    def test_missing_email(self, firebase_emulator, db):
-        """Test error when email is missing."""
-        response = requests.post(
-            self.url,
-            json={},
-            headers={"Content-Type": "application/json"}
-        )
-        
-        assert response.status_code == 400
-        data = response.json()
-        assert data["code"] == "missing_email"
-    
-    def test_ebook_not_configured(self, firebase_emulator, db):
-        """Test error when e-book storage path is not configured."""
-        self._create_test_lead(db, self.test_email)
-        # Don't create settings - should fail
-        
-        response = requests.post(
-            self.url,
-            json={"email": self.test_email},
-            headers={"Content-Type": "application/json"}
-        )
+        response = http.post(self.url, json={"email": self.test_email})
         
         assert response.status_code == 500
         data = response.json()
         assert data["code"] == "storage_not_configured"
     
-    def test_signed_url_generation_failure(self, firebase_emulator, db):
+    def test_signed_url_generation_failure(self, firebase_emulator, db, http):
         """Test error when signed URL generation fails."""
-        self._create_test_lead(db, self.test_email)
-        self._create_test_settings(db, self.ebook_path)
+        # Make signed URL generation fail
+        self.mock_url.side_effect = Exception("File not found")
         
-        # Mock signed URL generation to fail
-        with patch('src.brokers.https.get_download_link._generate_signed_url') as mock_url:
-            mock_url.side_effect = Exception("File not found")
-            
-            response = requests.post(
-                self.url,
-                json={"email": self.test_email},
-                headers={"Content-Type": "application/json"}
-            )
+        response = http.post(self.url, json={"email": self.test_email})
         
         assert response.status_code == 500
         data = response.json()
         assert data["code"] == "url_generation_failed"
     
-    def test_cors_preflight(self, firebase_emulator):
+    def test_cors_preflight(self, firebase_emulator, http):
         """Test CORS preflight request handling."""
-        response = requests.options(self.url)
+        response = http.options(self.url)
         
         assert response.status_code == 204
         assert "Access-Control-Allow-Origin" in response.headers
         assert "POST" in response.headers["Access-Control-Allow-Methods"]
-    
-    def test_invalid_method(self, firebase_emulator):
-        """Test invalid HTTP method."""
-        response = requests.get(self.url)
-        
-        assert response.status_code == 405
-        data = response.json()
-        assert data["code"] == "method_not_allowed"
-    
-    def test_invalid_json(self, firebase_emulator):
-        """Test invalid JSON payload."""
-        response = requests.post(
-            self.url,
-            data="invalid json",
-            headers={"Content-Type": "application/json"}
-        )
-        
-        assert response.status_code == 400
-        data = response.json()
-        assert data["code"] == "invalid_json"
-    
-    def test_download_limits_edge_cases(self, firebase_emulator, db):
-        """Test edge cases in download limit checking."""
-        from src.brokers.https.get_download_link import _check_download_limits
-        from datetime import datetime, timezone, timedelta
-        
-        now = datetime.now(timezone.utc)
-        
-        # Case 1: No previous downloads
-        lead_data = {"download": {"count24h": 0}}
-        can_download, message = _check_download_limits(lead_data)
-        assert can_download is True
-        assert message == ""
-        
-        # Case 2: Exactly at limit, but more than 24h ago
-        old_time = now - timedelta(hours=24, minutes=1)
-        lead_data = {
-            "download": {
-                "count24h": 3,
-                "lastDownloadedAt": old_time
-            }
-        }
-        can_download, message = _check_download_limits(lead_data)
-        assert can_download is True
-        
-        # Case 3: At limit, within 24h
-        recent_time = now - timedelta(hours=1)
-        lead_data = {
-            "download": {
-                "count24h": 3,
-                "lastDownloadedAt": recent_time
-            }
-        }
-        can_download, message = _check_download_limits(lead_data)
-        assert can_download is False
-        assert "Download limit reached" in message
-        assert "23" in message  # Should show ~23 hours remaining
-    
-    def test_ebook_storage_path_retrieval(self, firebase_emulator, db):
-        """Test e-book storage path retrieval function."""
-        from src.brokers.https.get_download_link import _get_ebook_storage_path
-        
-        # Case 1: Settings not configured
-        path = _get_ebook_storage_path(db)
-        assert path is None
-        
-        # Case 2: Settings configured properly
-        self._create_test_settings(db, self.ebook_path)
-        path = _get_ebook_storage_path(db)
-        assert path == self.ebook_path
-        
-        # Case 3: Settings exist but ebook not configured
-        db.collections["settings"].document("config").update({
-            "ebook": {}
-        })
-        path = _get_ebook_storage_path(db)
-        assert path is None
-    
-    def test_update_download_counters(self, firebase_emulator, db):
-        """Test download counter update logic."""
-        from src.brokers.https.get_download_link import _update_download_counters
-        
-        # Create test lead
-        lead_id = self._create_test_lead(db, self.test_email)
-        
-        # Get initial lead data
-        lead_doc = db.collections["leads"].document(lead_id).get()
-        initial_data = lead_doc.to_dict()
-        
-        # Update counters
-        _update_download_counters(db, lead_id, initial_data)
-        
-        # Verify updates
-        updated_doc = db.collections["leads"].document(lead_id).get()
-        updated_data = updated_doc.to_dict()
-        
-        assert updated_data["download"]["count24h"] == 1
-        assert updated_data["download"]["firstDownloadedAt"] is not None
-        assert updated_data["download"]["lastDownloadedAt"] is not None
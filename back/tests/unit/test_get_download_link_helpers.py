@@ -0,0 +1,100 @@
+"""Unit tests for get_download_link helper functions."""
+
+import pytest
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta, timezone
+
+from src.brokers.https.get_download_link import (
+    _check_download_limits,
+    _get_ebook_storage_path,
+    _update_download_counters,
+)
+
+
+EBOOK_PATH = "ebooks/bitcoin-red-pill-3rd-edition.pdf"
+NOW = datetime(2024, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def now_utc(monkeypatch):
+    """Freeze the handler's clock at NOW."""
+    monkeypatch.setattr("src.brokers.https.get_download_link._now", lambda: NOW)
+    return NOW
+
+
+class TestCheckDownloadLimits:
+    """Test download limit checks on lead data."""
+
+    def test_no_previous_downloads(self):
+        """Test a lead without downloads can download."""
+        assert _check_download_limits({"download": {"count24h": 0}}) == (True, "", 0)
+
+    def test_at_limit_after_24h(self, now_utc):
+        """Test the limit no longer applies once the last download is over 24h old."""
+        old_time = now_utc - timedelta(hours=24, minutes=1)
+        lead_data = {"download": {"count24h": 3, "lastDownloadedAt": old_time}}
+
+        can_download, _, _ = _check_download_limits(lead_data)
+
+        assert can_download is True
+
+    def test_at_limit_within_24h(self, now_utc):
+        """Test a lead at the limit within 24h is blocked."""
+        recent_time = now_utc - timedelta(hours=1)
+        lead_data = {"download": {"count24h": 3, "lastDownloadedAt": recent_time}}
+
+        can_download, message, retry_after = _check_download_limits(lead_data)
+
+        assert can_download is False
+        assert message == "Download limit reached. Try again in 23 hours."
+        assert retry_after == 23 * 3600
+
+
+class TestGetEbookStoragePath:
+    """Test e-book storage path retrieval from settings."""
+
+    @pytest.mark.parametrize("exists,settings,expected", [
+        pytest.param(False, None, None, id="settings_missing"),
+        pytest.param(True, {"ebook": {"storagePath": EBOOK_PATH}}, EBOOK_PATH, id="configured"),
+        pytest.param(True, {"ebook": {}}, None, id="ebook_not_configured"),
+    ])
+    def test_storage_path(self, exists, settings, expected):
+        """Test the storage path is read from the settings document."""
+        db = MagicMock()
+        settings_doc = db.collections["settings"].document.return_value.get.return_value
+        settings_doc.exists = exists
+        settings_doc.to_dict.return_value = settings
+
+        assert _get_ebook_storage_path(db) == expected
+
+
+class TestUpdateDownloadCounters:
+    """Test download counter updates."""
+
+    @pytest.mark.parametrize("download,expected", [
+        pytest.param(
+            {"count24h": 0, "firstDownloadedAt": None, "lastDownloadedAt": None},
+            {"download.count24h": 1, "download.lastDownloadedAt": NOW, "download.firstDownloadedAt": NOW},
+            id="first_download"
+        ),
+        pytest.param(
+            {"count24h": 2, "firstDownloadedAt": NOW - timedelta(hours=3), "lastDownloadedAt": NOW - timedelta(hours=2)},
+            {"download.count24h": 3, "download.lastDownloadedAt": NOW},
+            id="within_24h"
+        ),
+        pytest.param(
+            {"count24h": 3, "firstDownloadedAt": NOW - timedelta(hours=26), "lastDownloadedAt": NOW - timedelta(hours=25)},
+            {"download.count24h": 1, "download.lastDownloadedAt": NOW},
+            id="reset_after_24h"
+        ),
+    ])
+    def test_update_download_counters(self, download, expected):
+        """Test the lead is updated with the next count and timestamps."""
+        db = MagicMock()
+        db.timestamp_now.return_value = NOW
+        leads = db.collections["leads"]
+
+        _update_download_counters(db, "lead_123", {"download": download})
+
+        leads.document.assert_called_once_with("lead_123")
+        leads.document.return_value.update.assert_called_once_with(expected)
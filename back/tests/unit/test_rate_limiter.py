@@ -1,196 +1,282 @@
 """Unit tests for rate limiter."""
 
 import pytest
-from unittest.mock import patch
-from datetime import datetime, timedelta
-from src.util.rate_limiter import RateLimiter
+import time
+from src.util.rate_limiter import RateLimiter, NUM_SHARDS
+
+
+class FakeClock:
+    """Epoch-seconds clock that only moves when told to."""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def tick(self, seconds: float):
+        """Advance the clock."""
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    """Fake clock starting at the current time."""
+    return FakeClock(time.time())
+
+
+@pytest.fixture
+def limiter(clock):
+    """Fresh limiter driven by the fake clock, for tests that consume quota."""
+    return RateLimiter(now_fn=clock)
+
+
+@pytest.fixture(scope="class")
+def shared_limiter():
+    """Limiter shared across a class, for tests that don't touch its state."""
+    return RateLimiter()
+
+
+def _seed_bucket(limiter: RateLimiter, doc_id: str, tokens: float):
+    """Write a token bucket's state directly, instead of spending tokens one call at a time."""
+    limiter.db.collections["rate_limits"].document(doc_id).set({
+        "tokens": tokens,
+        "lastRefill": int(limiter._now())
+    })
+
+
+def _seed_global_count(limiter: RateLimiter, count: int):
+    """Set the global counter for the limiter's current minute to `count` (shard 0), clearing the other shards."""
+    rate_limits = limiter.db.collections["rate_limits"]
+    minute_key = f"global_{int(limiter._now()) // 60}"
+    batch = limiter.db.client.batch()
+    batch.set(rate_limits.document(f"{minute_key}_0"), {"count": count})
+    for shard in range(1, NUM_SHARDS):
+        batch.delete(rate_limits.document(f"{minute_key}_{shard}"))
+    batch.commit()
 
 
 class TestRateLimiter:
     """Test cases for RateLimiter class."""
 
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.rate_limiter = RateLimiter()
-
-    def test_ip_limit_allows_initial_requests(self):
+    def test_ip_limit_allows_initial_requests(self, limiter):
         """Test that IP rate limit allows initial requests."""
         ip = "192.168.1.1"
 
         # First 10 requests should be allowed
         for i in range(10):
-            allowed, remaining = self.rate_limiter.check_ip_limit(ip)
+            allowed, remaining = limiter.check_ip_limit(ip)
             assert allowed, f"Request {i+1} should be allowed"
             assert remaining == 9 - i, f"Remaining count should be {9 - i}"
 
-    def test_ip_limit_blocks_after_limit(self):
+    def test_ip_limit_blocks_after_limit(self, limiter):
         """Test that IP rate limit blocks after limit is reached."""
         ip = "192.168.1.2"
 
-        # Fill up the limit
-        for i in range(10):
-            self.rate_limiter.check_ip_limit(ip)
+        # One token left: the 10th request is allowed
+        _seed_bucket(limiter, RateLimiter._ip_doc_id(ip), tokens=1)
+        assert limiter.check_ip_limit(ip) == (True, 0)
 
         # 11th request should be blocked
-        allowed, remaining = self.rate_limiter.check_ip_limit(ip)
+        allowed, remaining = limiter.check_ip_limit(ip)
         assert not allowed, "11th request should be blocked"
         assert remaining == 0, "Remaining count should be 0"
 
-    def test_email_limit_allows_initial_requests(self):
+    def test_email_limit_allows_initial_requests(self, limiter):
         """Test that email rate limit allows initial requests."""
         email = "test@example.com"
 
         # First 3 requests should be allowed
         for i in range(3):
-            allowed, remaining = self.rate_limiter.check_email_limit(email)
+            allowed, remaining = limiter.check_email_limit(email)
             assert allowed, f"Request {i+1} should be allowed"
             assert remaining == 2 - i, f"Remaining count should be {2 - i}"
 
-    def test_email_limit_blocks_after_limit(self):
+    def test_email_limit_blocks_after_limit(self, limiter):
         """Test that email rate limit blocks after limit is reached."""
         email = "blocked@example.com"
 
-        # Fill up the limit
-        for i in range(3):
-            self.rate_limiter.check_email_limit(email)
+        # One token left: the 3rd request is allowed
+        _seed_bucket(limiter, RateLimiter._email_doc_id(email), tokens=1)
+        assert limiter.check_email_limit(email) == (True, 0)
 
         # 4th request should be blocked
-        allowed, remaining = self.rate_limiter.check_email_limit(email)
+        allowed, remaining = limiter.check_email_limit(email)
         assert not allowed, "4th request should be blocked"
         assert remaining == 0, "Remaining count should be 0"
 
-    def test_email_limit_case_insensitive(self):
-        """Test that email rate limit is case insensitive."""
-        # These should all count as the same email
-        emails = ["Test@Example.Com", "test@example.com", "TEST@EXAMPLE.COM"]
-
-        for i, email in enumerate(emails):
-            allowed, remaining = self.rate_limiter.check_email_limit(email)
-            assert allowed, f"Request {i+1} should be allowed"
-            assert remaining == 2 - i, f"Remaining count should be {2 - i}"
+    @pytest.mark.parametrize("variant", ["Test@Example.Com", "test@example.com", "TEST@EXAMPLE.COM"])
+    def test_email_limit_case_insensitive(self, limiter, variant):
+        """Test that every case variant of an email spends the same bucket."""
+        _seed_bucket(limiter, RateLimiter._email_doc_id("test@example.com"), tokens=1)
 
-        # 4th request with any variation should be blocked
-        allowed, remaining = self.rate_limiter.check_email_limit("test@example.com")
-        assert not allowed, "4th request should be blocked"
+        assert limiter.check_email_limit(variant) == (True, 0)
+        allowed, _ = limiter.check_email_limit("test@example.com")
+        assert not allowed, "Canonical email should share the variant's bucket"
 
-    def test_global_limit_allows_initial_requests(self):
+    def test_global_limit_allows_initial_requests(self, limiter):
         """Test that global rate limit allows initial requests."""
-        # First 100 requests should be allowed
-        for i in range(100):
-            allowed, remaining = self.rate_limiter.check_global_limit()
-            assert allowed, f"Request {i+1} should be allowed"
-            assert remaining == 99 - i, f"Remaining count should be {99 - i}"
+        _seed_global_count(limiter, 0)
 
-    def test_global_limit_blocks_after_limit(self):
+        allowed, remaining = limiter.check_global_limit()
+        assert allowed, "First request should be allowed"
+        assert remaining == 99, "Remaining count should be 99"
+
+    def test_global_limit_blocks_after_limit(self, limiter):
         """Test that global rate limit blocks after limit is reached."""
-        # Create new instance to reset counter
-        rate_limiter = RateLimiter()
+        _seed_global_count(limiter, 99)
 
-        # Fill up the limit
-        for i in range(100):
-            rate_limiter.check_global_limit()
+        # 100th request is the last one allowed
+        assert limiter.check_global_limit() == (True, 0)
 
         # 101st request should be blocked
-        allowed, remaining = rate_limiter.check_global_limit()
+        allowed, remaining = limiter.check_global_limit()
         assert not allowed, "101st request should be blocked"
         assert remaining == 0, "Remaining count should be 0"
 
-    def test_global_limit_resets_after_minute(self):
+    def test_global_limit_resets_after_minute(self, limiter, clock):
         """Test that global rate limit resets after a minute."""
         # Fill up the limit
-        for i in range(100):
-            self.rate_limiter.check_global_limit()
+        _seed_global_count(limiter, 100)
 
         # Should be blocked now
-        allowed, _ = self.rate_limiter.check_global_limit()
+        allowed, _ = limiter.check_global_limit()
         assert not allowed, "Should be blocked after limit"
 
-        # Mock time passing
-        future_time = datetime.now() + timedelta(seconds=61)
-        with patch('src.util.rate_limiter.datetime') as mock_datetime:
-            mock_datetime.now.return_value = future_time
+        # Move into the next minute, whose counter starts empty
+        clock.tick(61)
+        _seed_global_count(limiter, 0)
 
-            # Create new limiter to simulate time passing
-            new_limiter = RateLimiter()
-            allowed, remaining = new_limiter.check_global_limit()
-            assert allowed, "Should be allowed after minute passes"
-            assert remaining == 99, "Should have full quota after reset"
+        allowed, remaining = limiter.check_global_limit()
+        assert allowed, "Should be allowed after minute passes"
+        assert remaining == 99, "Should have full quota after reset"
 
-    def test_get_retry_after_ip(self):
+    def test_get_retry_after_ip(self, shared_limiter):
         """Test get_retry_after for IP rate limit."""
-        retry_after = self.rate_limiter.get_retry_after("ip")
-        assert retry_after == 3600, "IP retry after should be 1 hour"
+        retry_after = shared_limiter.get_retry_after("ip")
+        assert retry_after == 360, "IP retry after should be one token refill (6 minutes)"
 
-    def test_get_retry_after_email(self):
+    def test_get_retry_after_email(self, shared_limiter):
         """Test get_retry_after for email rate limit."""
-        retry_after = self.rate_limiter.get_retry_after("email")
-        assert retry_after == 86400, "Email retry after should be 1 day"
+        retry_after = shared_limiter.get_retry_after("email")
+        assert retry_after == 28800, "Email retry after should be one token refill (8 hours)"
 
-    def test_get_retry_after_global(self):
+    def test_get_retry_after_global(self, shared_limiter):
         """Test get_retry_after for global rate limit."""
-        retry_after = self.rate_limiter.get_retry_after("global")
+        retry_after = shared_limiter.get_retry_after("global")
         assert 1 <= retry_after <= 60, "Global retry after should be between 1 and 60 seconds"
 
-    def test_ip_limit_window_expiration(self):
-        """Test that IP rate limit entries expire after window."""
+    def test_ip_limit_window_expiration(self, limiter, clock):
+        """Test that a blocked IP gets its full quota back after the window."""
         ip = "192.168.1.3"
 
-        # Add some requests
-        for i in range(5):
-            self.rate_limiter.check_ip_limit(ip)
-
-        # Simulate time passing (more than 1 hour)
-        future_time = datetime.now() + timedelta(seconds=3601)
+        _seed_bucket(limiter, RateLimiter._ip_doc_id(ip), tokens=0)
+        allowed, _ = limiter.check_ip_limit(ip)
+        assert not allowed, "Empty bucket should be blocked"
 
-        # Clear old entries by checking with future timestamp
-        # This would need actual time mocking in production
-        # For now, we just verify the structure exists
-        assert ip in self.rate_limiter.ip_limits
-        assert len(self.rate_limiter.ip_limits[ip]) == 5
+        # More than 1 hour later the bucket has fully refilled
+        clock.tick(3601)
+        assert limiter.check_ip_limit(ip) == (True, 9)
 
-    def test_email_limit_window_expiration(self):
-        """Test that email rate limit entries expire after window."""
+    def test_email_limit_window_expiration(self, limiter, clock):
+        """Test that a blocked email gets its full quota back after the window."""
         email = "expire@example.com"
 
-        # Add some requests
-        for i in range(2):
-            self.rate_limiter.check_email_limit(email)
+        _seed_bucket(limiter, RateLimiter._email_doc_id(email), tokens=0)
+        allowed, _ = limiter.check_email_limit(email)
+        assert not allowed, "Empty bucket should be blocked"
 
-        # Verify the structure exists (hash is used internally)
-        assert len(self.rate_limiter.email_limits) > 0
+        # More than 1 day later the bucket has fully refilled
+        clock.tick(86401)
+        assert limiter.check_email_limit(email) == (True, 2)
 
-    def test_multiple_ips_tracked_separately(self):
+    def test_multiple_ips_tracked_separately(self, limiter):
         """Test that different IPs are tracked separately."""
         ip1 = "192.168.1.10"
         ip2 = "192.168.1.11"
 
         # Use up limit for first IP
         for i in range(10):
-            self.rate_limiter.check_ip_limit(ip1)
+            limiter.check_ip_limit(ip1)
 
         # Second IP should still be allowed
-        allowed, remaining = self.rate_limiter.check_ip_limit(ip2)
+        allowed, remaining = limiter.check_ip_limit(ip2)
         assert allowed, "Different IP should be allowed"
         assert remaining == 9, "New IP should have full quota minus one"
 
         # First IP should be blocked
-        allowed, _ = self.rate_limiter.check_ip_limit(ip1)
+        allowed, _ = limiter.check_ip_limit(ip1)
         assert not allowed, "First IP should still be blocked"
 
-    def test_multiple_emails_tracked_separately(self):
+    def test_multiple_emails_tracked_separately(self, limiter):
         """Test that different emails are tracked separately."""
         email1 = "user1@example.com"
         email2 = "user2@example.com"
 
         # Use up limit for first email
         for i in range(3):
-            self.rate_limiter.check_email_limit(email1)
+            limiter.check_email_limit(email1)
 
         # Second email should still be allowed
-        allowed, remaining = self.rate_limiter.check_email_limit(email2)
+        allowed, remaining = limiter.check_email_limit(email2)
         assert allowed, "Different email should be allowed"
         assert remaining == 2, "New email should have full quota minus one"
 
         # First email should be blocked
-        allowed, _ = self.rate_limiter.check_email_limit(email1)
-        assert not allowed, "First email should still be blocked"
\ No newline at end of file
+        allowed, _ = limiter.check_email_limit(email1)
+        assert not allowed, "First email should still be blocked"
+
+    def test_check_all_consumes_ip_and_email(self, limiter):
+        """Test that check_all checks IP and email limits together."""
+        results = limiter.check_all("192.168.1.20", "both@example.com")
+
+        assert results["ip"] == (True, 9), "IP should have full quota minus one"
+        assert results["email"] == (True, 2), "Email should have full quota minus one"
+        assert results["retry_after"] == 0
+
+    @pytest.mark.parametrize("tokens,expected", [
+        pytest.param(0, 360, id="empty"),
+        pytest.param(0.5, 180, id="half_token"),
+    ])
+    def test_check_all_reports_time_to_next_token(self, limiter, clock, tokens, expected):
+        """Test that a denied check reports when the bucket refills one token, not the full window."""
+        ip = "192.168.1.22"
+        _seed_bucket(limiter, RateLimiter._ip_doc_id(ip), tokens=tokens)
+
+        results = limiter.check_all(ip, "next-token@example.com")
+        assert results["ip"] == (False, 0)
+        assert results["retry_after"] == expected
+
+        # Answered from the deny cache, counting down
+        clock.tick(60)
+        assert limiter.check_all(ip, "next-token@example.com")["retry_after"] == expected - 60
+
+    def test_check_all_skips_email_when_ip_blocked(self, limiter):
+        """Test that check_all does not consume the email limit for a blocked IP."""
+        ip = "192.168.1.21"
+        email = "skipped@example.com"
+
+        # Use up limit for the IP
+        for i in range(10):
+            limiter.check_ip_limit(ip)
+
+        results = limiter.check_all(ip, email)
+        assert results["ip"] == (False, 0), "Blocked IP should be denied"
+        assert results["email"] == (False, 0), "Email should not be checked"
+
+        # Email quota should be untouched
+        allowed, remaining = limiter.check_email_limit(email)
+        assert allowed, "Email should still be allowed"
+        assert remaining == 2, "Email should have full quota minus one"
+
+    def test_global_limit_end_to_end(self, limiter):
+        """Test the global limit by spending the whole minute's quota one call at a time."""
+        _seed_global_count(limiter, 0)
+
+        for i in range(100):
+            allowed, remaining = limiter.check_global_limit()
+            assert allowed, f"Request {i+1} should be allowed"
+            assert remaining == 99 - i, f"Remaining count should be {99 - i}"
+
+        allowed, _ = limiter.check_global_limit()
+        assert not allowed, "101st request should be blocked"
@@ -1,7 +1,9 @@
 """Unit tests for retry decorators."""
 
+import itertools
+
 import pytest
-from unittest.mock import Mock
+import stripe
 from google.api_core.exceptions import (
     DeadlineExceeded,
     ServiceUnavailable,
@@ -9,20 +11,44 @@ from google.api_core.exceptions import (
     PermissionDenied,
 )
 
-from src.util.retry_decorators import retry_firestore_operation
+from src.util.retry_decorators import retry_firestore_operation, retry_stripe_operation
+
+
+class ScriptedOperation:
+    """Callable that raises or returns each scripted outcome in turn, counting calls."""
+
+    def __init__(self, outcomes):
+        self._outcomes = iter(outcomes)
+        self.call_count = 0
+
+    def __call__(self):
+        self.call_count += 1
+        outcome = next(self._outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
 
 
 class TestRetryDecorators:
     """Test retry decorator behavior."""
 
-    def test_retry_succeeds_on_second_attempt(self):
-        """Test that transient error is retried and eventually succeeds."""
-        mock_operation = Mock()
-        # First call fails, second succeeds
-        mock_operation.side_effect = [
-            DeadlineExceeded("Timeout"),
-            "success"
-        ]
+    @pytest.fixture(autouse=True)
+    def no_backoff(self, monkeypatch):
+        """Skip the real backoff between attempts and record requested waits."""
+        waits = []
+        # tenacity.nap.sleep is bound as the default at import, so patch the
+        # time.sleep it calls instead
+        monkeypatch.setattr("tenacity.nap.time.sleep", waits.append)
+        return waits
+
+    @pytest.mark.parametrize("exc_cls,msg", [
+        (DeadlineExceeded, "Timeout"),
+        (ServiceUnavailable, "Service down"),
+        (ResourceExhausted, "Quota exceeded"),
+    ])
+    def test_retry_on_transient_error(self, exc_cls, msg):
+        """Test that a transient error is retried and eventually succeeds."""
+        mock_operation = ScriptedOperation([exc_cls(msg), "success"])
 
         @retry_firestore_operation
         def operation():
@@ -35,13 +61,12 @@ class TestRetryDecorators:
 
     def test_retry_succeeds_on_third_attempt(self):
         """Test that operation succeeds on the third attempt."""
-        mock_operation = Mock()
         # First two calls fail, third succeeds
-        mock_operation.side_effect = [
+        mock_operation = ScriptedOperation([
             ServiceUnavailable("Service down"),
             ServiceUnavailable("Still down"),
             "success"
-        ]
+        ])
 
         @retry_firestore_operation
         def operation():
@@ -52,10 +77,9 @@ class TestRetryDecorators:
         assert result == "success"
         assert mock_operation.call_count == 3
 
-    def test_retry_exhausted_raises_exception(self):
+    def test_retry_exhausted_raises_exception(self, no_backoff):
         """Test that persistent failure raises exception after retries."""
-        mock_operation = Mock()
-        mock_operation.side_effect = ServiceUnavailable("Service down")
+        mock_operation = ScriptedOperation(itertools.repeat(ServiceUnavailable("Service down")))
 
         @retry_firestore_operation
         def operation():
@@ -66,45 +90,11 @@ class TestRetryDecorators:
 
         # Should retry 3 times (initial + 2 retries)
         assert mock_operation.call_count == 3
-
-    def test_retry_on_deadline_exceeded(self):
-        """Test that DeadlineExceeded triggers retry."""
-        mock_operation = Mock()
-        mock_operation.side_effect = [
-            DeadlineExceeded("Request timeout"),
-            "success"
-        ]
-
-        @retry_firestore_operation
-        def operation():
-            return mock_operation()
-
-        result = operation()
-
-        assert result == "success"
-        assert mock_operation.call_count == 2
-
-    def test_retry_on_resource_exhausted(self):
-        """Test that ResourceExhausted triggers retry."""
-        mock_operation = Mock()
-        mock_operation.side_effect = [
-            ResourceExhausted("Quota exceeded"),
-            "success"
-        ]
-
-        @retry_firestore_operation
-        def operation():
-            return mock_operation()
-
-        result = operation()
-
-        assert result == "success"
-        assert mock_operation.call_count == 2
+        assert len(no_backoff) == 2
 
     def test_no_retry_on_permanent_errors(self):
         """Test that permanent errors don't trigger retry."""
-        mock_operation = Mock()
-        mock_operation.side_effect = PermissionDenied("Access denied")
+        mock_operation = ScriptedOperation([PermissionDenied("Access denied")])
 
         @retry_firestore_operation
         def operation():
@@ -118,8 +108,7 @@ class TestRetryDecorators:
 
     def test_successful_operation_no_retry(self):
         """Test that successful operations don't trigger retry."""
-        mock_operation = Mock()
-        mock_operation.return_value = "success"
+        mock_operation = ScriptedOperation(["success"])
 
         @retry_firestore_operation
         def operation():
@@ -132,12 +121,11 @@ class TestRetryDecorators:
 
     def test_retry_with_return_value(self):
         """Test that retry preserves return values."""
-        mock_operation = Mock()
         expected_value = {"contact_id": "123", "list_id": "456"}
-        mock_operation.side_effect = [
+        mock_operation = ScriptedOperation([
             DeadlineExceeded("Timeout"),
             expected_value
-        ]
+        ])
 
         @retry_firestore_operation
         def operation():
@@ -147,3 +135,32 @@ class TestRetryDecorators:
 
         assert result == expected_value
         assert mock_operation.call_count == 2
+
+
+class TestRetryStripeOperation:
+    """Test Stripe retry decorator behavior."""
+
+    @pytest.fixture(autouse=True)
+    def no_backoff(self, monkeypatch):
+        """Skip the real backoff between attempts."""
+        monkeypatch.setattr("tenacity.nap.time.sleep", lambda seconds: None)
+
+    @pytest.mark.parametrize("exc", [
+        stripe.APIConnectionError("Connection reset"),
+        stripe.RateLimitError("Too many requests"),
+    ])
+    def test_retry_on_transient_error(self, exc):
+        """Test that connection and rate limit errors are retried."""
+        stripe_call = ScriptedOperation([exc, "success"])
+
+        assert retry_stripe_operation(stripe_call)() == "success"
+        assert stripe_call.call_count == 2
+
+    def test_no_retry_on_invalid_request(self):
+        """Test that request errors fail without retry."""
+        stripe_call = ScriptedOperation([stripe.InvalidRequestError("No such product", "id")])
+
+        with pytest.raises(stripe.InvalidRequestError):
+            retry_stripe_operation(stripe_call)()
+
+        assert stripe_call.call_count == 1
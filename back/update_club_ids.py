@@ -1,7 +1,11 @@
 """Update product club IDs in Firestore and Stripe."""
 
+import argparse
+import logging
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import stripe
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -21,162 +25,148 @@ if not firebase_admin._apps:
     else:
         firebase_admin.initialize_app()
 
+from club_ids import load_products
 from src.apis.Db import Db
 from src.documents.products.Product import Product
+from src.util.retry_decorators import retry_firestore_operation, retry_stripe_operation
+
+# One Firestore client for the process, created before the update threads start
+DB = Db.get_instance()
+PRODUCTS = DB.collections['products']
 
 # Initialize Stripe
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
 
+# Concurrent Firestore/Stripe updates
+MAX_WORKERS = 8
+
+logger = logging.getLogger("update_club_ids")
+
+@retry_firestore_operation
+def _write_firestore_club_id(product: Product, club_id: str = None):
+    """Set or clear the product's club_id, retrying transient Firestore errors."""
+    if club_id:
+        product.update_doc({'astron_club_id': club_id})
+    else:
+        # Firestore delete field by setting to None in some implementations
+        PRODUCTS.document(product.id).update({'astron_club_id': None})
+
+@retry_stripe_operation
+def _modify_stripe_club_id(stripe_product_id: str, club_id: str = None):
+    """Set or clear (empty string) the club_id metadata, retrying transient Stripe errors."""
+    stripe.Product.modify(
+        stripe_product_id,
+        metadata={'astron_club_id': club_id or ''}
+    )
+
 def update_firestore_product(product_id: str, club_id: str = None):
     """Update product club_id in Firestore."""
-    print(f"\n{'='*70}")
-    print(f"Updating Firestore Product: {product_id}")
-    print(f"{'='*70}")
-
     try:
         product = Product(id=product_id)
 
         if not product.doc:
-            print(f"❌ Product not found in Firestore: {product_id}")
+            logger.error("target=firestore product=%s error=not_found", product_id)
             return False
 
-        print(f"Current product data:")
-        print(f"  Name: {product.doc.name}")
-        print(f"  Current astron_club_id: {getattr(product.doc, 'astron_club_id', 'NOT SET')}")
-
-        if club_id:
-            print(f"\n✏️  Updating astron_club_id to: {club_id}")
-            product.update_doc({'astron_club_id': club_id})
-            print(f"✅ Updated successfully!")
-        else:
-            # Remove the field
-            print(f"\n✏️  Removing astron_club_id field")
-            # Firestore delete field by setting to None in some implementations
-            db = Db.get_instance()
-            doc_ref = db.collections['products'].document(product_id)
-            doc_ref.update({'astron_club_id': None})
-            print(f"✅ Field removed!")
+        old = getattr(product.doc, 'astron_club_id', None)
+        _write_firestore_club_id(product, club_id)
 
+        logger.info("target=firestore product=%s action=%s old=%s new=%s",
+                    product_id, "set" if club_id else "remove", old, club_id)
         return True
 
-    except Exception as e:
-        print(f"❌ Error updating Firestore: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("target=firestore product=%s error=update_failed", product_id)
         return False
 
-def update_stripe_product(stripe_product_id: str, club_id: str = None):
-    """Update product club_id in Stripe metadata."""
-    print(f"\n{'='*70}")
-    print(f"Updating Stripe Product: {stripe_product_id}")
-    print(f"{'='*70}")
+def update_stripe_product(stripe_product_id: str, club_id: str = None, verbose: bool = False):
+    """Update product club_id in Stripe metadata.
 
+    Stripe merges metadata on modify and deletes keys set to an empty
+    string, so no prior retrieve is needed; `verbose` fetches the product
+    only to show its current value.
+    """
     try:
-        product = stripe.Product.retrieve(stripe_product_id)
-
-        print(f"Current product data:")
-        print(f"  Name: {product.name}")
-        print(f"  Current astron_club_id: {product.metadata.get('astron_club_id', 'NOT SET')}")
-
-        if club_id:
-            print(f"\n✏️  Updating metadata.astron_club_id to: {club_id}")
-            updated = stripe.Product.modify(
-                stripe_product_id,
-                metadata={'astron_club_id': club_id}
-            )
-            print(f"✅ Updated successfully!")
-        else:
-            # Remove from metadata
-            print(f"\n✏️  Removing astron_club_id from metadata")
-            metadata = dict(product.metadata)
-            if 'astron_club_id' in metadata:
-                del metadata['astron_club_id']
-            updated = stripe.Product.modify(
-                stripe_product_id,
-                metadata=metadata
-            )
-            print(f"✅ Field removed!")
+        old = "unknown"
+        if verbose:
+            old = stripe.Product.retrieve(stripe_product_id).metadata.get('astron_club_id')
+
+        _modify_stripe_club_id(stripe_product_id, club_id)
 
+        logger.info("target=stripe product=%s action=%s old=%s new=%s",
+                    stripe_product_id, "set" if club_id else "remove", old, club_id)
         return True
 
-    except Exception as e:
-        print(f"❌ Error updating Stripe: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("target=stripe product=%s error=update_failed", stripe_product_id)
         return False
 
-def main():
-    """Update products with correct club IDs."""
-    print("\n" + "="*70)
-    print("  UPDATE ASTRON CLUB IDS")
-    print("="*70)
-    print("\nThis will update both Firestore and Stripe for:")
-    print("  ✅ Auto Custódia: Set to club ID 16831")
-    print("  🗑️  Other products: Remove astron_club_id (not needed yet)")
-
-    response = input("\nProceed? (yes/no): ").strip().lower()
-    if response != 'yes':
-        print("❌ Aborted")
-        return
-
-    # Product mappings (Firestore slug -> Stripe ID)
-    products = {
-        'auto-custodia': {
-            'stripe_id': 'prod_TFKu8wIkcLBKBf',
-            'name': 'Auto Custódia com RENATO 38',
-            'club_id': '16831'  # Numeric club ID as string
-        },
-        'futuros': {
-            'stripe_id': 'prod_TFKuGVOuPyVId7',
-            'name': 'Operando Futuros e Derivativos',
-            'club_id': None  # Remove for now
-        },
-        'lex-btc': {
-            'stripe_id': 'prod_TFKudCZVnhm9FO',
-            'name': 'Lex BTC',
-            'club_id': None  # Remove for now
-        }
-    }
-
-    success_count = 0
-    total_count = len(products) * 2  # Firestore + Stripe for each
-
+def main(verbose: bool = False, only: str = None, skip_firestore: bool = False,
+         skip_stripe: bool = False, yes: bool = False):
+    """Update products with correct club IDs.
+
+    Args:
+        verbose: Also fetch each Stripe product to show its current club ID
+        only: Update just this Firestore slug
+        skip_firestore: Leave Firestore untouched
+        skip_stripe: Leave Stripe untouched
+        yes: Skip the confirmation prompt
+    """
+    products = load_products(only)
+
+    targets = [target for target, skipped in (("firestore", skip_firestore), ("stripe", skip_stripe)) if not skipped]
+    for slug, product_info in products.items():
+        logger.info("planned product=%s targets=%s club_id=%s",
+                    slug, ",".join(targets), product_info['club_id'] or "remove")
+
+    if not yes:
+        response = input("\nProceed? (yes/no): ").strip().lower()
+        if response != 'yes':
+            logger.warning("Aborted")
+            return
+
+    # Every Firestore and Stripe update is independent, so run them all at once
+    tasks = []
     for firestore_slug, product_info in products.items():
-        print(f"\n\n{'#'*70}")
-        print(f"# Processing: {product_info['name']}")
-        print(f"{'#'*70}")
-
-        # Update Firestore
-        if update_firestore_product(firestore_slug, product_info['club_id']):
-            success_count += 1
-
-        # Update Stripe
-        if update_stripe_product(product_info['stripe_id'], product_info['club_id']):
-            success_count += 1
-
-    # Summary
-    print("\n" + "="*70)
-    print("  UPDATE SUMMARY")
-    print("="*70)
-    print(f"Successful updates: {success_count}/{total_count}")
-
-    if success_count == total_count:
-        print("\n✅ All updates completed successfully!")
-        print("\n📋 Next steps:")
-        print("  1. Test customer provisioning with Auto Custódia product")
-        print("  2. Verify Astron Members access is granted")
-        print("  3. Check magic link generation")
+        if not skip_firestore:
+            tasks.append((f"Firestore {firestore_slug}", update_firestore_product, firestore_slug, product_info['club_id']))
+        if not skip_stripe:
+            tasks.append((f"Stripe {product_info['stripe_id']}", update_stripe_product, product_info['stripe_id'], product_info['club_id'], verbose))
+
+    results = []
+    if tasks:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(tasks))) as executor:
+            futures = {executor.submit(fn, *args): label for label, fn, *args in tasks}
+            for future in as_completed(futures):
+                results.append((futures[future], future.result()))
+
+    total_count = len(tasks)
+    success_count = sum(ok for _, ok in results)
+    failed = sorted(label for label, ok in results if not ok)
+
+    if failed:
+        logger.error("summary succeeded=%d/%d failed=%s", success_count, total_count, "; ".join(failed))
     else:
-        print("\n⚠️  Some updates failed. Please review errors above.")
+        logger.info("summary succeeded=%d/%d", success_count, total_count)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--verbose', action='store_true', help="Show each Stripe product's current club ID")
+    parser.add_argument('--only', metavar='SLUG', choices=sorted(load_products()),
+                        help="Update just this Firestore product slug (one of: %(choices)s)")
+    parser.add_argument('--skip-firestore', action='store_true', help="Leave Firestore untouched")
+    parser.add_argument('--skip-stripe', action='store_true', help="Leave Stripe untouched")
+    parser.add_argument('--yes', action='store_true', help="Skip the confirmation prompt")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+
     try:
-        main()
+        main(verbose=args.verbose, only=args.only, skip_firestore=args.skip_firestore,
+             skip_stripe=args.skip_stripe, yes=args.yes)
     except KeyboardInterrupt:
-        print("\n\n⚠️  Interrupted by user")
+        logger.warning("Interrupted by user")
         sys.exit(1)
-    except Exception as e:
-        print(f"\n\n❌ Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Unexpected error")
         sys.exit(1)
@@ -1,5 +1,7 @@
 """Update product club IDs directly in Firestore (bypassing Pydantic validation)."""
 
+import argparse
+import logging
 import os
 import sys
 
@@ -20,112 +22,132 @@ if not firebase_admin._apps:
     else:
         firebase_admin.initialize_app()
 
+from itertools import islice
+
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore import DELETE_FIELD
+
+from club_ids import load_products
 from src.apis.Db import Db
+from src.util.retry_decorators import retry_firestore_operation
+
+# One Firestore client for the process
+DB = Db.get_instance()
+PRODUCTS = DB.collections['products']
 
-def main():
-    """Update club IDs directly in Firestore."""
-    print("\n" + "="*70)
-    print("  UPDATE FIRESTORE PRODUCT CLUB IDS (DIRECT)")
-    print("="*70)
+# Writes per batch commit; Firestore caps a batch at 500
+BATCH_SIZE = 450
 
-    db = Db.get_instance()
-    products_ref = db.collections['products']
+logger = logging.getLogger("update_club_ids")
 
+def show_current_values(updates: list):
+    """Log each product's current club ID with one read, without writing."""
+    snapshots = DB.client.get_all([PRODUCTS.document(update['slug']) for update in updates])
+    snapshots_by_slug = {snapshot.id: snapshot for snapshot in snapshots}
+
+    for update in updates:
+        doc = snapshots_by_slug.get(update['slug'])
+        if doc is None or not doc.exists:
+            logger.error("dry_run product=%s error=not_found", update['slug'])
+            continue
+
+        logger.info("dry_run product=%s old=%s new=%s",
+                    update['slug'], doc.to_dict().get('astron_club_id'), update['club_id'])
+
+def _commit_updates(chunk: list):
+    """Commit the club ID writes for `chunk` as one batch."""
+    batch = DB.client.batch()
+    for update in chunk:
+        batch.update(PRODUCTS.document(update['slug']), {'astron_club_id': update['club_id'] or DELETE_FIELD})
+    # Re-committing is safe: every write sets or deletes a fixed value
+    retry_firestore_operation(batch.commit)()
+
+def commit_chunk(chunk: list) -> int:
+    """Commit a chunk of updates, skipping products that don't exist.
+
+    A single missing document makes the whole batch fail with NotFound, so on
+    that failure the chunk's documents are read once and the batch is retried
+    with only the products that exist.
+
+    Returns:
+        Number of products updated
+    """
+    try:
+        _commit_updates(chunk)
+        logger.info("committed products=%s", ",".join(update['slug'] for update in chunk))
+        return len(chunk)
+    except NotFound:
+        pass
+
+    snapshots = DB.client.get_all([PRODUCTS.document(update['slug']) for update in chunk])
+    existing_slugs = {snapshot.id for snapshot in snapshots if snapshot.exists}
+    existing = [update for update in chunk if update['slug'] in existing_slugs]
+    missing = [update['slug'] for update in chunk if update['slug'] not in existing_slugs]
+    logger.error("product not found, skipped products=%s", ",".join(missing))
+
+    if existing:
+        _commit_updates(existing)
+        logger.info("committed products=%s", ",".join(update['slug'] for update in existing))
+    return len(existing)
+
+def main(dry_run: bool = False, only: str = None, yes: bool = False):
+    """Update club IDs directly in Firestore.
+
+    Args:
+        dry_run: Show the current and planned club IDs without writing
+        only: Update just this Firestore slug
+        yes: Skip the confirmation prompt
+    """
     updates = [
-        {
-            'slug': 'auto-custodia',
-            'club_id': '16831',
-            'action': 'Set'
-        },
-        {
-            'slug': 'futuros',
-            'club_id': None,
-            'action': 'Remove'
-        },
-        {
-            'slug': 'lex-btc',
-            'club_id': None,
-            'action': 'Remove'
-        }
+        {'slug': slug, 'club_id': product_info['club_id']}
+        for slug, product_info in load_products(only).items()
     ]
 
-    print("\nPlanned updates:")
     for update in updates:
-        action = f"Set to {update['club_id']}" if update['club_id'] else "Remove field"
-        print(f"  - {update['slug']}: {action}")
+        logger.info("planned product=%s club_id=%s", update['slug'], update['club_id'] or "remove")
 
-    response = input("\nProceed? (yes/no): ").strip().lower()
-    if response != 'yes':
-        print("❌ Aborted")
+    if dry_run:
+        show_current_values(updates)
         return
 
-    success_count = 0
-
-    for update in updates:
-        slug = update['slug']
-        club_id = update['club_id']
+    if not yes:
+        response = input("\nProceed? (yes/no): ").strip().lower()
+        if response != 'yes':
+            logger.warning("Aborted")
+            return
 
-        print(f"\n{'='*70}")
-        print(f"Processing: {slug}")
-        print(f"{'='*70}")
+    success_count = 0
 
+    # Queue all writes and commit them together, in chunks under the 500-write batch cap.
+    # Deleting a missing field is a no-op, so no read is needed to decide what to write.
+    pending = iter(updates)
+    while chunk := list(islice(pending, BATCH_SIZE)):
+        slugs = ",".join(update['slug'] for update in chunk)
         try:
-            doc_ref = products_ref.document(slug)
-            doc = doc_ref.get()
-
-            if not doc.exists:
-                print(f"❌ Product not found: {slug}")
-                continue
-
-            product_data = doc.to_dict()
-            print(f"Current product:")
-            print(f"  Name: {product_data.get('name', 'Unknown')}")
-            print(f"  Current astron_club_id: {product_data.get('astron_club_id', 'NOT SET')}")
-
-            if club_id:
-                print(f"  ✏️  Setting astron_club_id to: {club_id}")
-                doc_ref.update({'astron_club_id': club_id})
-                print(f"  ✅ Updated!")
-            else:
-                if 'astron_club_id' in product_data:
-                    print(f"  ✏️  Removing astron_club_id field")
-                    # Use FieldValue.delete() to remove field
-                    from google.cloud.firestore import DELETE_FIELD
-                    doc_ref.update({'astron_club_id': DELETE_FIELD})
-                    print(f"  ✅ Removed!")
-                else:
-                    print(f"  ℹ️  Field not present, skipping")
-
-            success_count += 1
-
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            import traceback
-            traceback.print_exc()
-
-    print(f"\n{'='*70}")
-    print("  SUMMARY")
-    print(f"{'='*70}")
-    print(f"Successful updates: {success_count}/{len(updates)}")
+            success_count += commit_chunk(chunk)
+        except Exception:
+            logger.exception("commit failed for products=%s", slugs)
 
     if success_count == len(updates):
-        print("\n✅ All Firestore updates completed!")
-        print("\n📋 Status:")
-        print("  ✅ Stripe metadata: Updated (from previous run)")
-        print("  ✅ Firestore: Updated")
-        print("\n✅ Auto Custódia product is now configured for Astron Members!")
-        print("  Club ID: 16831")
+        logger.info("summary succeeded=%d/%d", success_count, len(updates))
     else:
-        print("\n⚠️  Some updates failed")
+        logger.error("summary succeeded=%d/%d", success_count, len(updates))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dry-run', action='store_true', help="Show current and planned club IDs without writing")
+    parser.add_argument('--only', metavar='SLUG', choices=sorted(load_products()),
+                        help="Update just this Firestore product slug (one of: %(choices)s)")
+    parser.add_argument('--yes', action='store_true', help="Skip the confirmation prompt")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+
     try:
-        main()
+        main(dry_run=args.dry_run, only=args.only, yes=args.yes)
     except KeyboardInterrupt:
-        print("\n\n⚠️  Interrupted by user")
+        logger.warning("Interrupted by user")
         sys.exit(1)
-    except Exception as e:
-        print(f"\n\n❌ Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Unexpected error")
         sys.exit(1)